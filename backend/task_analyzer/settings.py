@@ -55,9 +55,24 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},
+    },
+    # Read-only connection used by the suggest path (see tasks/db.py).
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['tasks.db.ReadReplicaRouter']
+TASK_READ_DATABASE = 'replica'
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'en-us'
@@ -69,3 +84,40 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_EXPOSE_HEADERS = ['X-Analysis-Id']
+
+# Holiday calendar used for business-day urgency (see tasks/holidays.py).
+# None keeps the built-in holidays (Jan 1, Jul 4, Dec 25). Edits to the file
+# are picked up without a restart.
+TASK_HOLIDAYS_FILE = None
+TASK_HOLIDAY_REGION = 'default'
+
+# Seconds an analysis stays available for PATCH /api/tasks/analyze/<id>/.
+TASK_ANALYSIS_TIMEOUT = 3600
+
+# Analyze requests larger than this are queued as background jobs (202 + job
+# id) instead of being processed inline. See tasks/jobs.py.
+TASK_JOB_THRESHOLD_BYTES = 1024 * 1024
+# 0: jobs are run by `manage.py process_jobs`, outside the web processes.
+# Otherwise each web process runs this many worker threads.
+TASK_JOB_WORKERS = 0
+TASK_JOB_MAX_RUNNING = 2
+TASK_JOB_MAX_QUEUED_BYTES = 64 * 1024 * 1024
+# Django rejects larger bodies before the view sees them, so this must be at
+# least as large as the biggest job we are willing to queue.
+DATA_UPLOAD_MAX_MEMORY_SIZE = TASK_JOB_MAX_QUEUED_BYTES
+# Seconds a finished job's result is kept.
+TASK_JOB_RESULT_TTL = 3600
+# Workers renew a job's lease while running it; a job whose lease ran out
+# (its worker died) is requeued, and failed after TASK_JOB_MAX_ATTEMPTS tries.
+TASK_JOB_LEASE_SECONDS = 120
+TASK_JOB_MAX_ATTEMPTS = 2
+
+# Share a CSR snapshot of the dependency graph between worker processes via
+# shared memory (see tasks/graph_cache.py). None = a namespace derived from
+# the default database. `manage.py clear_graph_cache` removes the segments.
+TASK_GRAPH_CACHE = True
+TASK_GRAPH_CACHE_NAME = None
+# Seconds between checks that the snapshot still matches the tables, which
+# catches changes made without model signals (bulk_create, raw SQL).
+TASK_GRAPH_CACHE_CHECK_INTERVAL = 5.0
@@ -0,0 +1,35 @@
+"""
+Minimal settings profile for API-only workers.
+
+Drops the admin, sessions, messages and static files apps (and their
+middleware) so a worker only loads what the /api/tasks/ endpoints need:
+
+    DJANGO_SETTINGS_MODULE=task_analyzer.settings_api gunicorn task_analyzer.wsgi
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'rest_framework',
+    'corsheaders',
+    'tasks',
+]
+
+MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'task_analyzer.urls_api'
+
+TEMPLATES = []
+
+# The API is anonymous; skip DRF's session/basic auth and the browsable API
+# so neither django.contrib.auth backends nor templates are touched per request.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'UNAUTHENTICATED_USER': None,
+}
@@ -0,0 +1,287 @@
+"""
+Stored analyses for what-if re-scoring.
+
+When the client asks for it (?keep=1), AnalyzeTasksView saves the result
+under a random analysis id in the Django cache. A later PATCH with a few
+changed tasks only re-scores what the change can affect (the changed tasks
+and the tasks whose blocker counts moved), re-checks cycles from the added
+edges only, and reports how ranks shifted. PATCHes of one analysis are
+serialised with a lock key taken with cache.add().
+
+Configure a shared cache backend (e.g. Redis or the database cache) when
+running more than one worker process; the default LocMemCache is per-process.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .columns import score_columns, validate_columns
+from .db import use_read_replica
+from .graph_cache import get_graph
+from .models import Task
+from .scoring import calculate_priority_score, count_dependents, creates_cycle, detect_cycles, get_score_explanation
+from .serializers import TaskAnalysisSerializer
+
+CACHE_KEY_PREFIX = 'task-analysis:'
+CYCLE_ERROR = {"error": "Circular dependencies detected. Please resolve dependencies before analyzing."}
+BUSY_ERROR = {"error": "This analysis is being updated by another request. Please retry."}
+# Seconds a PATCH may hold an analysis lock, and wait for someone else's.
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2.0
+# Report scoring progress every this many tasks.
+PROGRESS_EVERY = 1000
+
+
+class AnalysisError(Exception):
+    """Raised with the 400 response body when a task list cannot be analyzed."""
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class CycleError(AnalysisError):
+    def __init__(self, detail=CYCLE_ERROR):
+        super().__init__(detail)
+
+
+class AnalysisBusy(AnalysisError):
+    """Another request holds the analysis lock; answered with 409."""
+    def __init__(self, detail=BUSY_ERROR):
+        super().__init__(detail)
+
+
+def fetch_dependencies(task_ids):
+    """
+    Dependency fetcher for detect_cycles/creates_cycle backed by the Task table,
+    answered from the shared graph snapshot when it is enabled.
+    """
+    graph = get_graph()
+    if graph is not None:
+        return graph.fetch_dependencies(task_ids)
+    with use_read_replica():
+        tasks_with_deps = Task.objects.filter(id__in=task_ids).prefetch_related('dependencies')
+        return [
+            {'id': t.id, 'dependencies': [d.id for d in t.dependencies.all()]}
+            for t in tasks_with_deps
+        ]
+
+
+def _cache_key(analysis_id):
+    return CACHE_KEY_PREFIX + analysis_id
+
+
+def _timeout():
+    return getattr(settings, 'TASK_ANALYSIS_TIMEOUT', 3600)
+
+
+def _ranking(rows):
+    """Row positions ordered by score desc; ties keep input order like list.sort."""
+    return sorted(range(len(rows)), key=lambda i: rows[i]['score'], reverse=True)
+
+
+def score_tasks(tasks, progress=None, explain=True):
+    """
+    Score validated tasks and return (rows in input order, dependents counts).
+    progress: Optional callable receiving the fraction of tasks scored so far.
+    explain: If False, rows get no 'explanation' and none is computed.
+    """
+    tasks_map = {t.get('id'): t for t in tasks if t.get('id') is not None}
+    dependents = count_dependents(tasks_map.values())
+
+    rows = []
+    for i, task in enumerate(tasks):
+        if progress and i and i % PROGRESS_EVERY == 0:
+            progress(i / len(tasks))
+        count = dependents.get(task.get('id'), 0)
+        score = calculate_priority_score(task, tasks_map, dependents_count=count)
+        row = dict(task)
+        row['score'] = score
+        if explain:
+            row['explanation'] = get_score_explanation(task, score, tasks_map, dependents_count=count)
+        rows.append(row)
+    return rows, dependents
+
+
+def analyze_tasks(data, progress=None, explain=True, keep=False):
+    """
+    The full analyze pipeline: validate, check cycles, score and, if keep, store.
+    data: a task dict or list of task dicts as posted by the client.
+    progress: Optional callable receiving a 0-1 completion fraction.
+    explain: If False, skip explanations (also for later PATCHes of this analysis).
+    Returns (results sorted by score desc, analysis id or None); raises AnalysisError.
+    """
+    # Allow single object or list
+    if not isinstance(data, list):
+        data = [data]
+
+    serializer = TaskAnalysisSerializer(data=data, many=True)
+    if not serializer.is_valid():
+        raise AnalysisError(serializer.errors)
+    tasks = serializer.validated_data
+    if progress:
+        progress(0.2)
+
+    if detect_cycles(tasks, dependency_fetcher=fetch_dependencies):
+        raise CycleError()
+    if progress:
+        progress(0.3)
+
+    rows, dependents = score_tasks(tasks, progress=progress and (lambda f: progress(0.3 + 0.7 * f)), explain=explain)
+    # Keep the scored rows so PATCH can re-score just the delta
+    analysis_id = save_analysis(rows, dependents, explain=explain) if keep else None
+
+    # Sort by score desc
+    results = sorted(rows, key=lambda x: x['score'], reverse=True)
+    return results, analysis_id
+
+
+def analyze_columns(task_columns, explain=True):
+    """
+    analyze_tasks for a columnar batch (see tasks/columns.py). Returns result
+    columns sorted by score desc; raises AnalysisError. Columnar analyses are
+    not stored, so they have no analysis id for PATCH.
+    """
+    columns, errors = validate_columns(task_columns.columns)
+    if errors:
+        raise AnalysisError(errors)
+    result = score_columns(columns, dependency_fetcher=fetch_dependencies, explain=explain)
+    if result is None:
+        raise CycleError()
+    return result
+
+
+def select_fields(results, fields):
+    """
+    Keep only the requested fields of analyze/suggest results: of each row for
+    a list of rows, or of the column dict for columnar results. fields=None
+    keeps everything.
+    """
+    if fields is None:
+        return results
+    if isinstance(results, dict):
+        return {name: results[name] for name in fields if name in results}
+    return [{name: row[name] for name in fields if name in row} for row in results]
+
+
+def save_analysis(rows, dependents, analysis_id=None, explain=True):
+    """Store scored rows and return the analysis id."""
+    analysis_id = analysis_id or uuid.uuid4().hex
+    state = {
+        'rows': rows,
+        'index': {row['id']: i for i, row in enumerate(rows) if row.get('id') is not None},
+        'dependents': dependents,
+        'ranking': _ranking(rows),
+        'explain': explain,
+    }
+    cache.set(_cache_key(analysis_id), state, _timeout())
+    return analysis_id
+
+
+def load_analysis(analysis_id):
+    """Return the stored state for analysis_id, or None if unknown or expired."""
+    return cache.get(_cache_key(analysis_id))
+
+
+@contextmanager
+def locked_analysis(analysis_id):
+    """
+    Hold the lock for analysis_id while loading, changing and saving it, so
+    concurrent PATCHes cannot overwrite each other. Waits up to LOCK_WAIT
+    seconds, then raises AnalysisBusy.
+    """
+    key = _cache_key(analysis_id) + ':lock'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, token, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise AnalysisBusy()
+        time.sleep(0.05)
+    try:
+        yield
+    finally:
+        if cache.get(key) == token:  # Not expired and taken over meanwhile
+            cache.delete(key)
+
+
+def apply_changes(analysis_id, state, changes, dependency_fetcher=None):
+    """
+    Apply validated task changes to a stored analysis and save it. Call it
+    inside locked_analysis(analysis_id).
+
+    changes: list of full task dicts (existing ids are replaced, new ids appended).
+    Raises CycleError if the changes introduce a circular dependency.
+    Returns a list of {id, score, previous_score, rank, previous_rank, explanation}
+    for every task whose score or rank moved, ordered by new rank. Ranks are
+    1-based; previous_rank/previous_score are None for new tasks. There is no
+    explanation if the analysis was created without explanations.
+    """
+    rows = state['rows']
+    index = state['index']
+    explain = state.get('explain', True)
+    dependents = dict(state['dependents'])
+
+    graph = {row['id']: row.get('dependencies', []) for row in rows if row.get('id') is not None}
+    added_edges = []
+    affected = set()
+    for change in changes:
+        task_id = change['id']
+        old_deps = set(graph.get(task_id, []))
+        new_deps = set(change.get('dependencies', []))
+        graph[task_id] = list(change.get('dependencies', []))
+        added_edges.extend((task_id, dep_id) for dep_id in new_deps - old_deps)
+        for dep_id in new_deps - old_deps:
+            dependents[dep_id] = dependents.get(dep_id, 0) + 1
+        for dep_id in old_deps - new_deps:
+            dependents[dep_id] = dependents.get(dep_id, 0) - 1
+        affected.add(task_id)
+        affected.update(new_deps ^ old_deps)
+
+    if creates_cycle(graph, added_edges, dependency_fetcher=dependency_fetcher):
+        raise CycleError()
+
+    previous_rank = {pos: rank for rank, pos in enumerate(state['ranking'], start=1)}
+    previous_score = {pos: rows[pos]['score'] for pos in range(len(rows))}
+
+    rows = list(rows)
+    index = dict(index)
+    for change in changes:
+        if change['id'] in index:
+            rows[index[change['id']]] = dict(change)
+        else:
+            index[change['id']] = len(rows)
+            rows.append(dict(change))
+
+    for task_id in affected:
+        pos = index.get(task_id)
+        if pos is None:  # A dependency outside this analysis
+            continue
+        row = dict(rows[pos])
+        count = dependents.get(task_id, 0)
+        row['score'] = calculate_priority_score(row, {}, dependents_count=count)
+        if explain:
+            row['explanation'] = get_score_explanation(row, row['score'], {}, dependents_count=count)
+        rows[pos] = row
+
+    ranking = _ranking(rows)
+    state.update(rows=rows, index=index, dependents=dependents, ranking=ranking)
+    cache.set(_cache_key(analysis_id), state, _timeout())
+
+    diff = []
+    for rank, pos in enumerate(ranking, start=1):
+        row = rows[pos]
+        if previous_rank.get(pos) == rank and previous_score.get(pos) == row['score']:
+            continue
+        entry = {
+            'id': row.get('id'),
+            'score': row['score'],
+            'previous_score': previous_score.get(pos),
+            'rank': rank,
+            'previous_rank': previous_rank.get(pos),
+        }
+        if explain:
+            entry['explanation'] = row['explanation']
+        diff.append(entry)
+    return diff
@@ -0,0 +1,34 @@
+from django.apps import AppConfig
+
+
+class TasksConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'tasks'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import m2m_changed, post_delete, post_save
+        from . import graph_cache, holidays, jobs
+        from .db import configure_connection
+        from .models import Task
+
+        connection_created.connect(configure_connection)
+
+        post_save.connect(graph_cache.invalidate_on_change, sender=Task)
+        post_delete.connect(graph_cache.invalidate_on_change, sender=Task)
+        m2m_changed.connect(graph_cache.invalidate_on_change, sender=Task.dependencies.through)
+
+        holidays_file = getattr(settings, 'TASK_HOLIDAYS_FILE', None)
+        try:
+            holidays.configure(holidays_file, getattr(settings, 'TASK_HOLIDAY_REGION', holidays.DEFAULT_REGION))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+            raise ImproperlyConfigured(f"TASK_HOLIDAYS_FILE {holidays_file!r} could not be loaded: {exc}") from exc
+
+        # In-process job workers start with the first request rather than
+        # here, so migrate, shell and the autoreloader's parent process do
+        # not start them.
+        if getattr(settings, 'TASK_JOB_WORKERS', jobs.DEFAULTS['TASK_JOB_WORKERS']):
+            request_started.connect(jobs.pool.start, dispatch_uid='tasks.jobs.pool')
@@ -0,0 +1,223 @@
+"""
+Offline batch scoring for large task exports.
+
+Files are read in fixed-size chunks, so memory use is bounded by the chunk
+size rather than the file size. NDJSON is read through mmap; CSV goes through
+csv.reader on a buffered text stream, because quoted fields may contain
+newlines. Scoring happens in two passes:
+
+1. Count blockers: every 'dependencies' entry bumps a compact array indexed
+   by task id (ids are the integer primary keys from the Task table). If the
+   ids turn out to be sparse, the counts move to a dict instead.
+2. Score each chunk with calculate_priority_score, passing the precomputed
+   dependents count, then either keep a top-K heap or write sorted runs to
+   temporary files that are k-way merged into the final ranking.
+
+Like tasks.scoring, this module does not need Django.
+"""
+import csv
+import heapq
+import json
+import mmap
+import os
+import tempfile
+from array import array
+
+from .scoring import calculate_priority_score
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # bytes
+# count_blockers keeps a dense array while the largest dependency id is at
+# most DENSE_MIN_SLOTS or DENSE_FACTOR times the number of tasks read so far.
+DENSE_MIN_SLOTS = 1 << 20
+DENSE_FACTOR = 4
+# Numeric CSV columns, converted like the JSON numbers in NDJSON input.
+CSV_NUMBER_FIELDS = ('id', 'estimated_hours', 'importance')
+
+
+def detect_format(path):
+    """Guess 'csv' or 'ndjson' from the file extension."""
+    return 'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'ndjson'
+
+
+def iter_line_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of raw lines (bytes, without newline) from a memory-mapped file.
+    Each chunk covers roughly chunk_size bytes and always ends on a line boundary.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    newline = mm.find(b'\n', end)
+                    end = size if newline == -1 else newline + 1
+                yield mm[start:end].splitlines()
+                start = end
+
+
+def _parse_dependencies(value):
+    """CSV dependencies are a ';'-separated list of ids, e.g. '3;7;12'."""
+    if not value:
+        return []
+    return [int(v) for v in value.split(';') if v.strip()]
+
+
+def _parse_number(value):
+    """'3' -> 3, '2.5' -> 2.5; blank stays as it is. Raises ValueError otherwise."""
+    if not value.strip():
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _csv_task(header, row):
+    task = dict(zip(header, row))
+    for name in CSV_NUMBER_FIELDS:
+        if name in task:
+            task[name] = _parse_number(task[name])
+    if task.get('id') == '':
+        del task['id']
+    task['dependencies'] = _parse_dependencies(task.get('dependencies'))
+    return task
+
+
+def iter_csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of task dicts from a CSV file with a header row, about
+    chunk_size bytes of fields per list. Records are split by csv.reader, so
+    quoted fields may contain newlines and commas.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is None:
+            return
+        tasks, size = [], 0
+        for row in rows:
+            if not any(field.strip() for field in row):
+                continue
+            tasks.append(_csv_task(header, row))
+            size += sum(len(field) + 1 for field in row)
+            if size >= chunk_size:
+                yield tasks
+                tasks, size = [], 0
+        if tasks:
+            yield tasks
+
+
+def iter_task_chunks(path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of task dicts parsed from an NDJSON or CSV file.
+    CSV files must have a header row naming the task fields.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == 'csv':
+        yield from iter_csv_chunks(path, chunk_size)
+        return
+    for lines in iter_line_chunks(path, chunk_size):
+        yield [json.loads(line) for line in lines if line.strip()]
+
+
+def count_blockers(path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    First pass: return counts where counts[task_id] is the number of tasks
+    that depend on task_id. That is an array('L') grown to the largest id
+    seen while ids are dense, or a dict once an id is far beyond the number
+    of tasks (see DENSE_FACTOR), so memory follows the input, not the ids.
+    Raises ValueError for dependency ids that are not non-negative integers.
+    """
+    counts = array('L')
+    rows = 0
+    for tasks in iter_task_chunks(path, fmt, chunk_size):
+        for task in tasks:
+            rows += 1
+            # Like count_dependents, a task blocks each dependency at most once.
+            for dep_id in set(task.get('dependencies') or []):
+                if isinstance(dep_id, bool) or not isinstance(dep_id, int) or dep_id < 0:
+                    raise ValueError(f"Invalid dependency id {dep_id!r} in task {task.get('id')!r}")
+                if isinstance(counts, array) and dep_id >= len(counts):
+                    if dep_id >= max(DENSE_MIN_SLOTS, DENSE_FACTOR * rows):
+                        counts = {i: n for i, n in enumerate(counts) if n}
+                    else:
+                        counts.extend([0] * (max(dep_id + 1, 2 * len(counts)) - len(counts)))
+                if isinstance(counts, dict):
+                    counts[dep_id] = counts.get(dep_id, 0) + 1
+                else:
+                    counts[dep_id] += 1
+    return counts
+
+
+def _blocker_count(counts, task_id):
+    if not isinstance(task_id, int):
+        return 0
+    if isinstance(counts, dict):
+        return counts.get(task_id, 0)
+    return counts[task_id] if 0 <= task_id < len(counts) else 0
+
+
+def _iter_scored(path, counts, fmt, chunk_size):
+    """Second pass: yield (score, task) chunk by chunk, with the input sequence number."""
+    seq = 0
+    for tasks in iter_task_chunks(path, fmt, chunk_size):
+        scored = []
+        for task in tasks:
+            dependents = _blocker_count(counts, task.get('id'))
+            task['score'] = calculate_priority_score(task, {}, dependents_count=dependents)
+            scored.append((seq, task))
+            seq += 1
+        yield scored
+
+
+def top_k(path, k, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return the k highest-scoring tasks, best first, holding at most k tasks in memory."""
+    counts = count_blockers(path, fmt, chunk_size)
+    heap = []
+    for scored in _iter_scored(path, counts, fmt, chunk_size):
+        for seq, task in scored:
+            # Earlier tasks win ties, matching the stable sort used by the API.
+            entry = (task['score'], -seq, json.dumps(task, default=str))
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+    return [json.loads(line) for _, _, line in sorted(heap, reverse=True)]
+
+
+def _read_run(run_file):
+    run_file.seek(0)
+    for line in run_file:
+        neg_score, seq, task_json = line.split('\t', 2)
+        yield float(neg_score), int(seq), task_json
+
+
+def rank_file(path, out, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write every task from path to the text stream out as NDJSON, ranked by score.
+    Each scored chunk is sorted and spilled to a temporary run file; the runs
+    are then merged, so only one chunk plus one line per run is held in memory.
+    Returns the number of tasks written.
+    """
+    counts = count_blockers(path, fmt, chunk_size)
+    runs = []
+    try:
+        for scored in _iter_scored(path, counts, fmt, chunk_size):
+            scored.sort(key=lambda item: (-item[1]['score'], item[0]))
+            run = tempfile.TemporaryFile('w+', encoding='utf-8')
+            for seq, task in scored:
+                run.write(f"{-task['score']}\t{seq}\t{json.dumps(task, default=str)}\n")
+            runs.append(run)
+
+        written = 0
+        for _, _, task_json in heapq.merge(*(_read_run(run) for run in runs)):
+            out.write(task_json)
+            written += 1
+        return written
+    finally:
+        for run in runs:
+            run.close()
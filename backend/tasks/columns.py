@@ -0,0 +1,137 @@
+"""
+Columnar task batches for the binary wire formats (see parsers.py/renderers.py).
+
+A batch is a dict of equal-length columns:
+
+    {"id": [...], "title": [...], "due_date": [...], "estimated_hours": [...],
+     "importance": [...], "dependencies": [[...], ...]}
+
+"id" and "dependencies" are optional, as in TaskAnalysisSerializer. Columns
+are validated as a whole and scored with priority_score/explain_score
+directly, without building a dict or running a DRF field per task.
+"""
+import math
+from datetime import date
+
+from .holidays import get_calendar
+from .scoring import count_dependents, detect_cycles, explain_score, priority_score
+
+REQUIRED_COLUMNS = ('title', 'due_date', 'estimated_hours', 'importance')
+
+
+class TaskColumns:
+    """Parsed request body for columnar content types; wraps {name: sequence}."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['title']) if 'title' in self.columns else 0
+
+
+def _check(values, name, valid, message, errors):
+    for i, value in enumerate(values):
+        if not valid(value):
+            errors[name] = [f"Row {i}: {message}"]
+            return
+
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_integral(value):
+    """An int, or a float with no fractional part (as DRF's IntegerField accepts); not a bool."""
+    if isinstance(value, float):
+        return value.is_integer()
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_finite_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _is_id_list(value):
+    """A dependencies cell: None or a list/tuple of integer ids (not bools)."""
+    if value is None:
+        return True
+    return isinstance(value, (list, tuple)) and all(isinstance(d, int) and not isinstance(d, bool) for d in value)
+
+
+def validate_columns(columns):
+    """
+    Check and normalise a columnar batch.
+    Returns (normalised columns, errors); errors is a dict like serializer.errors.
+    """
+    errors = {}
+    for name in REQUIRED_COLUMNS:
+        if name not in columns:
+            errors[name] = ["This column is required."]
+    if errors:
+        return None, errors
+
+    n = len(columns['title'])
+    for name, values in columns.items():
+        if len(values) != n:
+            errors[name] = [f"Expected {n} values, got {len(values)}."]
+    if errors:
+        return None, errors
+
+    due_dates = [_to_date(v) for v in columns['due_date']]
+    _check(due_dates, 'due_date', lambda v: v is not None, "Date has wrong format. Use YYYY-MM-DD.", errors)
+    _check(columns['title'], 'title', lambda v: isinstance(v, str) and v.strip(), "A valid non-blank string is required.", errors)
+    _check(columns['importance'], 'importance', _is_integral, "A valid integer is required.", errors)
+    _check(columns['estimated_hours'], 'estimated_hours', _is_finite_number, "A valid number is required.", errors)
+
+    ids = columns.get('id', [None] * n)
+    _check(ids, 'id', lambda v: v is None or (isinstance(v, int) and not isinstance(v, bool)), "A valid integer is required.", errors)
+    dependencies = columns.get('dependencies')
+    if dependencies is None:
+        dependencies = [[] for _ in range(n)]
+    else:
+        _check(dependencies, 'dependencies', _is_id_list, "Expected a list of integers.", errors)
+        if 'dependencies' not in errors:
+            dependencies = [list(d) if d is not None else [] for d in dependencies]
+    if errors:
+        return None, errors
+
+    normalised = dict(columns)
+    normalised.update(id=ids, due_date=due_dates, importance=[int(v) for v in columns['importance']], dependencies=dependencies)
+    return normalised, {}
+
+
+def score_columns(columns, dependency_fetcher=None, explain=True):
+    """
+    Score a validated batch. Returns the result columns (input columns plus
+    'score' and, if explain, 'explanation') sorted by score desc, or None if
+    the dependencies contain a cycle.
+    """
+    ids = columns['id']
+    graph = {task_id: deps for task_id, deps in zip(ids, columns['dependencies']) if task_id is not None}
+    if detect_cycles([{'id': task_id, 'dependencies': deps} for task_id, deps in graph.items()], dependency_fetcher=dependency_fetcher):
+        return None
+    dependents = count_dependents({'dependencies': deps} for deps in graph.values())
+
+    calendar = get_calendar()
+    today = date.today()
+    scores = []
+    explanations = []
+    for task_id, due_date, importance, hours in zip(ids, columns['due_date'], columns['importance'], columns['estimated_hours']):
+        days_until_due = calendar.business_days(today, due_date)
+        count = dependents.get(task_id, 0) if task_id else 0
+        score = priority_score(days_until_due, float(importance), float(hours), count)
+        scores.append(score)
+        if explain:
+            explanations.append(explain_score(days_until_due, float(importance), float(hours), count))
+
+    order = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+    result = {name: [values[i] for i in order] for name, values in columns.items()}
+    result['score'] = [scores[i] for i in order]
+    if explain:
+        result['explanation'] = [explanations[i] for i in order]
+    return result
@@ -0,0 +1,83 @@
+"""
+Database routing and connection setup.
+
+Read-heavy paths (SuggestTasksView, fetch_dependencies) wrap their queries in
+use_read_replica(); while it is active, ReadReplicaRouter sends reads to the
+alias named by settings.TASK_READ_DATABASE. Everything else, and every write,
+stays on 'default'.
+
+For SQLite the replica is a second connection to the same file: 'default'
+switches the file to WAL mode so readers no longer wait behind writers, and
+the replica connection is made read-only with PRAGMA query_only. Point the
+alias at a real replica (e.g. a local Postgres standby) in production.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_use_replica = ContextVar('use_read_replica', default=False)
+
+
+def read_alias():
+    """The configured read alias, or None if it is not in DATABASES."""
+    alias = getattr(settings, 'TASK_READ_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def use_read_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return read_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created handler: WAL on the SQLite primary, read-only replica."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if connection.alias == read_alias():
+            cursor.execute('PRAGMA query_only = ON')
+            if connection.is_in_memory_db():
+                # The in-memory test database the replica mirrors is opened in
+                # shared-cache mode; this lets the replica see rows written
+                # inside a test's open transaction instead of hitting "table
+                # is locked". File databases never get it.
+                cursor.execute('PRAGMA read_uncommitted = ON')
+        else:
+            cursor.execute('PRAGMA journal_mode = WAL')
+
+
+def check_databases():
+    """Run a trivial query on every configured alias; returns {alias: error or None}."""
+    results = {}
+    for alias in settings.DATABASES:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            results[alias] = None
+        except Exception as exc:
+            results[alias] = str(exc)
+    return results
@@ -0,0 +1,422 @@
+"""
+Shared-memory snapshot of the Task.dependencies graph.
+
+The graph is stored in compressed-sparse-row form as one flat int64 array in
+a multiprocessing.shared_memory segment, so every worker process on the host
+reads the same copy:
+
+    [MAGIC, version, n_nodes, n_edges,
+     ids[n]                      sorted task ids; node i is ids[i]
+     fwd_offsets[n + 1], fwd[m]  dependencies of node i: fwd[fwd_offsets[i]:fwd_offsets[i + 1]]
+     rev_offsets[n + 1], rev[m]  dependents of node i, same layout
+     fingerprint[4]]             database fingerprint the snapshot was built from
+
+A small control segment holds three counters: the current graph version
+(bumped by invalidate() whenever tasks or dependencies change), the version
+of the published snapshot, and the sequence number naming the published data
+segment. get_graph() only compares counters in memory; a process rebuilds
+from the database (two queries) only when the published snapshot is older
+than the current version, then publishes it for everyone else.
+
+Task saves/deletes and dependency add/remove/clear invalidate the snapshot
+through signals (see TasksConfig.ready()). bulk_create, QuerySet.update or
+delete on the through table, raw SQL and migrations send no signals; call
+invalidate() after them. As a safety net, get_graph() also compares the
+snapshot with a cheap fingerprint of the tables (task count and max id, edge
+count and max id) at most every TASK_GRAPH_CACHE_CHECK_INTERVAL seconds and
+rebuilds on a mismatch, so missed changes are picked up within that interval.
+
+Every process bumps the version once when it first attaches, so a snapshot
+left behind by an earlier run is never trusted. Segment names are derived
+from TASK_GRAPH_CACHE_NAME, which defaults to a name derived from the default
+database, so every process using that database (web workers, `manage.py
+shell`, restarts of the server) shares one control segment, one published
+data segment and one lock file. Those outlive the server on purpose; remove
+them with `python manage.py clear_graph_cache` (or cleanup()) once no server
+is running.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from multiprocessing import resource_tracker, shared_memory
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process lock
+    fcntl = None
+
+MAGIC = 0x43535232  # 'CSR2'
+HEADER_SIZE = 4
+FINGERPRINT_SIZE = 4
+ITEM_SIZE = 8
+# Control segment slots
+CURRENT_VERSION, PUBLISHED_VERSION, PUBLISHED_SEQ = range(3)
+
+
+def enabled():
+    return getattr(settings, 'TASK_GRAPH_CACHE', True)
+
+
+def _check_interval():
+    return getattr(settings, 'TASK_GRAPH_CACHE_CHECK_INTERVAL', 5.0)
+
+
+def _namespace():
+    name = getattr(settings, 'TASK_GRAPH_CACHE_NAME', None)
+    if name:
+        return name
+    db = settings.DATABASES['default']
+    key = f"{db.get('ENGINE')}|{db.get('HOST', '')}|{db.get('PORT', '')}|{db.get('NAME')}"
+    return f"task-graph-{hashlib.sha1(key.encode()).hexdigest()[:12]}"
+
+
+def _lock_path(name):
+    return os.path.join(tempfile.gettempdir(), f'{name}.lock')
+
+
+def _untrack(shm):
+    """
+    Segments outlive the process that created them (another worker may publish
+    the next snapshot), so keep the resource tracker from unlinking them at exit.
+    """
+    if os.name == 'posix':  # Only POSIX segments are registered
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+def _unlink(shm):
+    """Remove the segment's name; processes still attached keep their mapping."""
+    if os.name == 'posix':
+        # SharedMemory.unlink() unregisters the name, so register it again first.
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+def _open(name, size=None):
+    """Attach to a segment, or create it with `size` bytes if it does not exist and size is given."""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        if size is None:
+            raise
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:  # Lost a race with another process
+            shm = shared_memory.SharedMemory(name=name)
+    _untrack(shm)
+    return shm
+
+
+def _create(name, size):
+    """Create a fresh segment, replacing any leftover one with the same name."""
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        stale = _open(name)
+        _unlink(stale)
+        stale.close()
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    _untrack(shm)
+    return shm
+
+
+class DependencyGraph:
+    """Read-only view of a CSR snapshot. Lookups are by task id; unknown ids have no edges."""
+
+    def __init__(self, shm):
+        self._shm = shm
+        self._words = memoryview(shm.buf).cast('q')
+        magic, self.version, n, m = self._words[:HEADER_SIZE]
+        if magic != MAGIC:
+            raise ValueError("Not a dependency graph segment")
+        pos = HEADER_SIZE
+        self.ids = self._words[pos:pos + n]
+        pos += n
+        self._fwd_offsets = self._words[pos:pos + n + 1]
+        pos += n + 1
+        self._fwd = self._words[pos:pos + m]
+        pos += m
+        self._rev_offsets = self._words[pos:pos + n + 1]
+        pos += n + 1
+        self._rev = self._words[pos:pos + m]
+        pos += m
+        self.fingerprint = tuple(self._words[pos:pos + FINGERPRINT_SIZE])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __del__(self):
+        for view in ('ids', '_fwd_offsets', '_fwd', '_rev_offsets', '_rev', '_words'):
+            if hasattr(self, view):
+                getattr(self, view).release()
+        self._shm.close()
+
+    def index(self, task_id):
+        i = bisect_left(self.ids, task_id)
+        if i < len(self.ids) and self.ids[i] == task_id:
+            return i
+        return None
+
+    def __contains__(self, task_id):
+        return self.index(task_id) is not None
+
+    def dependencies(self, task_id):
+        """Ids of the tasks task_id depends on."""
+        i = self.index(task_id)
+        if i is None:
+            return []
+        return [self.ids[j] for j in self._fwd[self._fwd_offsets[i]:self._fwd_offsets[i + 1]]]
+
+    def dependents(self, task_id):
+        """Ids of the tasks that depend on task_id."""
+        i = self.index(task_id)
+        if i is None:
+            return []
+        return [self.ids[j] for j in self._rev[self._rev_offsets[i]:self._rev_offsets[i + 1]]]
+
+    def dependents_count(self, task_id):
+        i = self.index(task_id)
+        if i is None:
+            return 0
+        return self._rev_offsets[i + 1] - self._rev_offsets[i]
+
+    def fetch_dependencies(self, task_ids):
+        """Same contract as analysis.fetch_dependencies, answered from the snapshot."""
+        return [{'id': task_id, 'dependencies': self.dependencies(task_id)} for task_id in task_ids if task_id in self]
+
+
+def build_csr(ids, edges, version=0, fingerprint=(0,) * FINGERPRINT_SIZE):
+    """
+    Pack task ids and (task_id, dependency_id) edges into the segment layout.
+    Returns an array('q'). Edges naming unknown ids are dropped.
+    """
+    ids = sorted(set(ids))
+    position = {task_id: i for i, task_id in enumerate(ids)}
+    pairs = [(position[a], position[b]) for a, b in edges if a in position and b in position]
+    n, m = len(ids), len(pairs)
+
+    def csr(pairs):
+        offsets = array('q', [0]) * (n + 1)
+        for src, _ in pairs:
+            offsets[src + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        targets = array('q', [0]) * m
+        fill = array('q', offsets[:n])
+        for src, dst in pairs:
+            targets[fill[src]] = dst
+            fill[src] += 1
+        return offsets, targets
+
+    fwd_offsets, fwd = csr(pairs)
+    rev_offsets, rev = csr([(b, a) for a, b in pairs])
+
+    words = array('q', [MAGIC, version, n, m])
+    for part in (array('q', ids), fwd_offsets, fwd, rev_offsets, rev, array('q', fingerprint)):
+        words.extend(part)
+    return words
+
+
+def _fingerprint():
+    """(task count, max task id, edge count, max edge id): changes whenever rows are added or removed."""
+    from django.db.models import Count, Max
+    from .db import use_read_replica
+    from .models import Task
+
+    with use_read_replica():
+        tasks = Task.objects.aggregate(n=Count('id'), top=Max('id'))
+        edges = Task.dependencies.through.objects.aggregate(n=Count('id'), top=Max('id'))
+    return (tasks['n'], tasks['top'] or 0, edges['n'], edges['top'] or 0)
+
+
+def _load_from_db():
+    from .db import use_read_replica
+    from .models import Task
+
+    # Fingerprint first: a change racing the load makes it stale, never falsely fresh.
+    fingerprint = _fingerprint()
+    with use_read_replica():
+        ids = list(Task.objects.values_list('id', flat=True))
+        edges = list(Task.dependencies.through.objects.values_list('from_task_id', 'to_task_id'))
+    return ids, edges, fingerprint
+
+
+class GraphCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._control = None
+        self._name = None
+        self._graph = None
+        self._checked_at = None
+
+    def _control_words(self):
+        name = _namespace()
+        if self._control is None or self._name != name:
+            shm = _open(f'{name}-ctl', size=ITEM_SIZE * 4)
+            self._control = (shm, memoryview(shm.buf).cast('q'))
+            self._name = name
+            # Never trust a snapshot published before this process started:
+            # the database may have changed while nobody was watching.
+            with self._locked():
+                self._control[1][CURRENT_VERSION] += 1
+        return self._control[1]
+
+    def _locked(self):
+        return _ControlLock(self._name, self._lock)
+
+    def reset(self):
+        """Drop this process's control and snapshot mappings; the next get() re-attaches."""
+        with self._lock:
+            if self._control is not None:
+                shm, words = self._control
+                words.release()
+                shm.close()
+            self._control = self._name = self._graph = self._checked_at = None
+
+    def invalidate(self):
+        """Mark every published snapshot as stale. Call after tasks/dependencies change."""
+        control = self._control_words()
+        with self._locked():
+            control[CURRENT_VERSION] += 1
+
+    def get(self):
+        """Return the current DependencyGraph, rebuilding and publishing it if stale."""
+        graph = self._current()
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= _check_interval():
+            self._checked_at = now
+            if graph.fingerprint != _fingerprint():
+                # Changed without signals (bulk_create, raw SQL, ...)
+                self.invalidate()
+                graph = self._current()
+        return graph
+
+    def _current(self):
+        control = self._control_words()
+        wanted = control[CURRENT_VERSION]
+        graph = self._graph
+        if graph is not None and graph.version == wanted:
+            return graph
+
+        if control[PUBLISHED_VERSION] == wanted and control[PUBLISHED_SEQ]:
+            try:
+                shm = _open(f'{self._name}-{control[PUBLISHED_SEQ]}')
+                graph = DependencyGraph(shm)
+            except (FileNotFoundError, ValueError):
+                graph = None
+            if graph is not None and graph.version == wanted:
+                self._graph = graph
+                return graph
+
+        return self._rebuild(control, wanted)
+
+    def _rebuild(self, control, wanted):
+        ids, edges, fingerprint = _load_from_db()
+        words = build_csr(ids, edges, version=wanted, fingerprint=fingerprint)
+        payload = words.tobytes()
+
+        with self._locked():
+            previous = control[PUBLISHED_SEQ]
+            name = f'{self._name}-{previous + 1}'
+            shm = _create(name, len(payload))
+            shm.buf[:len(payload)] = payload
+            # A newer invalidate() may have raced the rebuild; only publish
+            # if this snapshot is not older than what is already published.
+            if wanted >= control[PUBLISHED_VERSION]:
+                control[PUBLISHED_VERSION] = wanted
+                control[PUBLISHED_SEQ] = previous + 1
+                if previous:
+                    self._unlink_published(f'{self._name}-{previous}')
+            else:
+                _unlink(shm)  # Still usable here; just never shared
+        graph = DependencyGraph(shm)
+        self._graph = graph
+        return graph
+
+    @staticmethod
+    def _unlink_published(name):
+        try:
+            shm = _open(name)
+        except FileNotFoundError:
+            return
+        _unlink(shm)
+        shm.close()
+
+
+class _ControlLock:
+    """Serialise control-segment updates across processes (flock) and threads."""
+
+    def __init__(self, name, thread_lock):
+        self._path = _lock_path(name)
+        self._thread_lock = thread_lock
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            self._file = open(self._path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        self._thread_lock.release()
+
+
+cache = GraphCache()
+
+
+def get_graph():
+    """The shared dependency graph, or None when TASK_GRAPH_CACHE is off."""
+    return cache.get() if enabled() else None
+
+
+def invalidate():
+    if enabled():
+        cache.invalidate()
+
+
+def cleanup():
+    """
+    Unlink the current namespace's segments and lock file. Processes still
+    attached keep working on their mappings; the next get_graph() anywhere
+    starts a fresh namespace.
+    """
+    name = _namespace()
+    cache.reset()
+    try:
+        control = _open(f'{name}-ctl')
+    except FileNotFoundError:
+        control = None
+    if control is not None:
+        words = memoryview(control.buf).cast('q')
+        published = words[PUBLISHED_SEQ]
+        words.release()
+        if published:
+            GraphCache._unlink_published(f'{name}-{published}')
+        _unlink(control)
+        control.close()
+    try:
+        os.unlink(_lock_path(name))
+    except FileNotFoundError:
+        pass
+
+
+def invalidate_on_change(sender, **kwargs):
+    """Receiver for Task saves/deletes and dependency changes (see TasksConfig.ready)."""
+    if kwargs.get('action', 'post_').startswith('pre_'):
+        return  # m2m_changed fires before and after; the post_ signal is enough
+    if 'created' in kwargs and not kwargs['created']:
+        return  # Editing a task's fields does not change the graph
+    invalidate()
+    # Again after commit: a snapshot rebuilt mid-transaction by another
+    # connection could not see the change yet.
+    transaction.on_commit(invalidate)
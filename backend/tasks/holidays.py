@@ -0,0 +1,244 @@
+"""
+Holiday calendars and business-day arithmetic used by scoring.
+
+A calendar is a set of holiday rules for one region. Rules come from a JSON
+file shaped like:
+
+    {
+        "regions": {
+            "US": ["01-01", {"date": "07-04", "observed": true}, "12-25", "2026-11-26"],
+            "UK": ["01-01", {"date": "12-26", "observed": true}]
+        }
+    }
+
+"MM-DD" entries recur every year, "YYYY-MM-DD" entries apply once, and
+"observed": true moves a holiday that falls on a Saturday to the Friday
+before and one on a Sunday to the Monday after.
+
+Each calendar compiles its rules into one business-day bitmap per year and
+a prefix-sum array over the compiled span of days, so the number of business
+days between two dates is two array lookups. The span never reaches more than
+MAX_SPAN_YEARS from the current year; days beyond it count weekdays only.
+
+The file is re-read when its mtime changes, so edits apply without restarting
+the server. If a reload fails (e.g. the file is missing or half-written), the
+last good calendars stay in use and the error is logged.
+
+Like tasks.scoring, this module does not need Django; TasksConfig.ready()
+wires it to settings.TASK_HOLIDAYS_FILE / TASK_HOLIDAY_REGION.
+"""
+import calendar as _calendar
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGION = 'default'
+# Used when no holiday file is configured; matches the original hard-coded list.
+DEFAULT_RULES = ['01-01', '12-25', '07-04']
+# Years compiled either side of the current year on first use.
+INITIAL_SPAN_YEARS = 5
+# Years either side of the current year beyond which nothing is compiled.
+MAX_SPAN_YEARS = 50
+# Seconds between checks of the holiday file's mtime.
+RELOAD_INTERVAL = 5.0
+
+
+def _parse_rule(rule):
+    """Normalise a rule to (year or None, month, day, observed)."""
+    if isinstance(rule, str):
+        rule = {'date': rule}
+    value = rule['date']
+    observed = bool(rule.get('observed', False))
+    if len(value) == 5:
+        month, day = value.split('-')
+        return None, int(month), int(day), observed
+    parsed = datetime.strptime(value, '%Y-%m-%d').date()
+    return parsed.year, parsed.month, parsed.day, observed
+
+
+class HolidayCalendar:
+    def __init__(self, rules=None):
+        self.rules = [_parse_rule(r) for r in (DEFAULT_RULES if rules is None else rules)]
+        self._bitmaps = {}
+        self._lock = threading.Lock()
+        # (first ordinal, first year, last year, prefix array); swapped atomically.
+        self._span = None
+
+    def holidays_in_year(self, year):
+        """Return the set of dates in `year` on which a holiday is observed."""
+        days = set()
+        # Observed rules can move Jan 1 into the previous December and Dec 31
+        # into the next January, so look at the neighbouring years as well.
+        for rule_year in (year - 1, year, year + 1):
+            for fixed_year, month, day, observed in self.rules:
+                if fixed_year is not None and fixed_year != rule_year:
+                    continue
+                try:
+                    holiday = date(rule_year, month, day)
+                    if observed and holiday.weekday() == 5:
+                        holiday -= timedelta(days=1)
+                    elif observed and holiday.weekday() == 6:
+                        holiday += timedelta(days=1)
+                except (ValueError, OverflowError):  # e.g. 02-29 in a non-leap year, or past year 9999
+                    continue
+                if holiday.year == year:
+                    days.add(holiday)
+        return days
+
+    def year_bitmap(self, year):
+        """Return a bytearray with 1 for each business day of `year` (index 0 = Jan 1)."""
+        bitmap = self._bitmaps.get(year)
+        if bitmap is None:
+            start = date(year, 1, 1)
+            n_days = 366 if _calendar.isleap(year) else 365
+            holidays = {(d - start).days for d in self.holidays_in_year(year)}
+            first_weekday = start.weekday()
+            bitmap = bytearray(
+                1 if (first_weekday + i) % 7 < 5 and i not in holidays else 0
+                for i in range(n_days)
+            )
+            self._bitmaps[year] = bitmap
+        return bitmap
+
+    def _compile(self, first_year, last_year):
+        prefix = array('l', [0])
+        total = 0
+        for year in range(first_year, last_year + 1):
+            for is_business_day in self.year_bitmap(year):
+                total += is_business_day
+                prefix.append(total)
+        self._span = (date(first_year, 1, 1).toordinal(), first_year, last_year, prefix)
+
+    def _span_covering(self, start, end):
+        this_year = date.today().year
+        low, high = max(this_year - MAX_SPAN_YEARS, 1), this_year + MAX_SPAN_YEARS
+        first = min(max(start.year, low), high)
+        last = max(min(end.year, high), low)
+        span = self._span
+        if span is not None and span[1] <= first and last <= span[2]:
+            return span
+        with self._lock:
+            span = self._span
+            if span is None:
+                first_year, last_year = this_year - INITIAL_SPAN_YEARS, this_year + INITIAL_SPAN_YEARS
+            else:
+                first_year, last_year = span[1], span[2]
+            first_year = min(first_year, first)
+            last_year = max(last_year, last)
+            if span is None or (first_year, last_year) != (span[1], span[2]):
+                self._compile(first_year, last_year)
+            return self._span
+
+    def is_business_day(self, day):
+        return bool(self.year_bitmap(day.year)[day.timetuple().tm_yday - 1])
+
+    def business_days(self, start, end):
+        """
+        Count business days in [start, end). If end is before start, return the
+        (negative) number of calendar days instead, so overdue tasks report how
+        late they are.
+        """
+        if start > end:
+            return (end - start).days
+        base, _, _, prefix = self._span_covering(start, end)
+        last = base + len(prefix) - 1
+
+        def before(ordinal):
+            # Business days in [base, ordinal); weekdays only outside the span.
+            if ordinal < base:
+                return -_weekdays(ordinal, base)
+            if ordinal > last:
+                return prefix[-1] + _weekdays(last, ordinal)
+            return prefix[ordinal - base]
+
+        return before(end.toordinal()) - before(start.toordinal())
+
+
+def _weekdays(first, stop):
+    """Number of Monday-Friday days with ordinals in [first, stop)."""
+    weeks, extra = divmod(stop - first, 7)
+    weekday = (first - 1) % 7  # date.fromordinal(1) is a Monday
+    return weeks * 5 + sum(1 for i in range(extra) if (weekday + i) % 7 < 5)
+
+
+def load_calendars(path):
+    """Read a holiday file and return {region: HolidayCalendar}."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return {region: HolidayCalendar(rules) for region, rules in data.get('regions', {}).items()}
+
+
+_config_lock = threading.Lock()
+_config = {
+    'path': None,
+    'region': DEFAULT_REGION,
+    'calendars': {},
+    'mtime': None,
+    'checked_at': None,
+}
+_default_calendar = HolidayCalendar()
+
+
+def configure(path=None, region=DEFAULT_REGION):
+    """
+    Point the shared calendar at a holiday file and region (None = built-in defaults).
+    The file is loaded straight away, so a missing or invalid file raises here
+    (OSError or ValueError) rather than on the first scoring call.
+    """
+    calendars, mtime = {}, None
+    if path is not None:
+        mtime = os.stat(path).st_mtime
+        calendars = load_calendars(path)
+    with _config_lock:
+        _config.update(path=path, region=region or DEFAULT_REGION, calendars=calendars, mtime=mtime, checked_at=time.monotonic())
+
+
+def reload():
+    """Force the holiday file to be re-read on the next get_calendar() call."""
+    with _config_lock:
+        _config.update(mtime=None, checked_at=None)
+
+
+def _refresh():
+    path = _config['path']
+    now = time.monotonic()
+    checked_at = _config['checked_at']
+    if checked_at is not None and now - checked_at < RELOAD_INTERVAL:
+        return
+    with _config_lock:
+        _config['checked_at'] = now
+        try:
+            mtime = os.stat(path).st_mtime
+            if mtime != _config['mtime']:
+                _config['calendars'] = load_calendars(path)
+                _config['mtime'] = mtime
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+            # Mid-edit or deleted: keep the last good calendars and retry later.
+            logger.warning("Could not reload holiday file %s: %s", path, exc)
+
+
+def get_calendar(region=None):
+    """
+    Return the compiled calendar for `region` (default: the configured region).
+    Regions missing from the holiday file fall back to weekends only.
+    """
+    if _config['path'] is None:
+        return _default_calendar
+    _refresh()
+    region = region or _config['region']
+    calendars = _config['calendars']
+    calendar = calendars.get(region)
+    if calendar is None:
+        calendar = calendars[region] = HolidayCalendar([])
+    return calendar
+
+
+def business_days(start, end, region=None):
+    """Business days in [start, end) using the shared calendar; see HolidayCalendar.business_days."""
+    return get_calendar(region).business_days(start, end)
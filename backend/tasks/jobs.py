@@ -0,0 +1,297 @@
+"""
+Background processing for oversized analyze requests.
+
+AnalyzeTasksView hands any body larger than TASK_JOB_THRESHOLD_BYTES (JSON,
+MessagePack or Arrow) to submit(), which stores it as an AnalysisJob row and
+answers 202 with the job id. The AnalysisJob table is the queue: workers claim the oldest queued row
+with a conditional UPDATE, run the normal analyze pipeline while writing
+progress back to the row, and store the result (or the 400 body) for
+GET /api/tasks/jobs/<id>/ for TASK_JOB_RESULT_TTL seconds after it finishes.
+Queued jobs wait for a worker however long that takes.
+
+A worker renews its job's heartbeat_at every third of
+TASK_JOB_LEASE_SECONDS. If the worker dies (a restarted web process, a killed
+process_jobs), the lease runs out and claim_next() puts the job back in the
+queue, or fails it once it has been tried TASK_JOB_MAX_ATTEMPTS times.
+
+Admission control keeps bursts from swamping the API:
+- at most TASK_JOB_MAX_RUNNING jobs run at once across all workers;
+- submit() rejects new jobs once queued payloads would exceed
+  TASK_JOB_MAX_QUEUED_BYTES, and the view answers 503 with Retry-After.
+Both checks write first (claim or insert) and count second in the same
+transaction. The write takes SQLite's database lock, so concurrent workers
+and submitters are checked one at a time.
+
+By default jobs are run by `python manage.py process_jobs`, so CPU-bound
+analyses do not compete with request threads for the GIL. With
+TASK_JOB_WORKERS > 0, each web process instead starts that many worker
+threads when it serves its first request (see TasksConfig.ready()), which
+also picks up jobs queued or orphaned before a restart.
+"""
+import io
+import json
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .analysis import AnalysisError, analyze_columns, analyze_tasks, select_fields
+from .columns import TaskColumns
+from .models import AnalysisJob
+from .parsers import binary_parsers
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TASK_JOB_THRESHOLD_BYTES': 1024 * 1024,
+    'TASK_JOB_WORKERS': 0,
+    'TASK_JOB_MAX_RUNNING': 2,
+    'TASK_JOB_MAX_QUEUED_BYTES': 64 * 1024 * 1024,
+    'TASK_JOB_RESULT_TTL': 3600,
+    'TASK_JOB_POLL_INTERVAL': 1.0,
+    'TASK_JOB_LEASE_SECONDS': 120,
+    'TASK_JOB_MAX_ATTEMPTS': 2,
+}
+# Only write progress to the row when it moved at least this much.
+PROGRESS_STEP = 0.05
+WORKER_LOST_ERROR = {"error": "The worker running this job stopped before it finished. Please resubmit the request."}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class _NoSlot(Exception):
+    """Rolls back a claim that would exceed TASK_JOB_MAX_RUNNING."""
+
+
+def _setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+def _parsers():
+    """Parser class for each body format a job can hold, by media type."""
+    return {parser.media_type: parser for parser in [JSONParser] + binary_parsers()}
+
+
+def media_type(request):
+    return request.content_type.split(';')[0].strip()
+
+
+def should_queue(request):
+    """True if the request body is in a queueable format and large enough to be processed as a job."""
+    if media_type(request) not in _parsers():
+        return False
+    length = request.META.get('CONTENT_LENGTH')
+    try:
+        # Without a Content-Length (e.g. a chunked upload under ASGI), measure the body itself.
+        size = int(length) if length else len(request.body)
+    except ValueError:
+        return False
+    return size > _setting('TASK_JOB_THRESHOLD_BYTES')
+
+
+def submit(payload, content_type='application/json', options=None):
+    """
+    Queue a raw request body for analysis. Raises QueueFull if accepting it
+    would exceed TASK_JOB_MAX_QUEUED_BYTES.
+    content_type: the body's media type; one of the formats AnalyzeTasksView parses.
+    options: the request's {'keep', 'fields', 'explain'} options (see AnalyzeTasksView).
+    """
+    if not isinstance(payload, bytes):
+        payload = payload.encode('utf-8')
+    size = len(payload)
+    with transaction.atomic():
+        # Insert first, then check: the INSERT takes SQLite's write lock, so
+        # concurrent submitters see each other's jobs when they add up the
+        # total. Raising rolls the insert back.
+        job = AnalysisJob.objects.create(
+            payload=payload,
+            content_type=content_type,
+            payload_bytes=size,
+            options=options or {},
+        )
+        queued = AnalysisJob.objects.filter(status=AnalysisJob.QUEUED).aggregate(total=Sum('payload_bytes'))['total']
+        if queued > _setting('TASK_JOB_MAX_QUEUED_BYTES'):
+            raise QueueFull()
+    transaction.on_commit(pool.notify)
+    return job
+
+
+def requeue_stale():
+    """
+    Put running jobs whose lease expired back in the queue, or fail them after
+    TASK_JOB_MAX_ATTEMPTS tries. Returns the number of jobs changed.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=_setting('TASK_JOB_LEASE_SECONDS'))
+    stale = AnalysisJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=AnalysisJob.RUNNING,
+    )
+    failed = stale.filter(attempts__gte=_setting('TASK_JOB_MAX_ATTEMPTS')).update(
+        status=AnalysisJob.FAILED,
+        result=json.dumps(WORKER_LOST_ERROR),
+        payload=b'',
+        progress=1,
+        finished_at=now,
+        expires_at=now + timedelta(seconds=_setting('TASK_JOB_RESULT_TTL')),
+    )
+    requeued = stale.update(status=AnalysisJob.QUEUED, started_at=None, heartbeat_at=None, progress=0)
+    if failed or requeued:
+        logger.warning("Lost analysis job workers: %d job(s) requeued, %d failed", requeued, failed)
+    return failed + requeued
+
+
+def claim_next():
+    """Mark the oldest queued job as running and return it, or None if nothing can run."""
+    requeue_stale()
+    max_running = _setting('TASK_JOB_MAX_RUNNING')
+    if AnalysisJob.objects.filter(status=AnalysisJob.RUNNING).count() >= max_running:
+        return None
+    for job_id in AnalysisJob.objects.filter(status=AnalysisJob.QUEUED).values_list('id', flat=True)[:5]:
+        try:
+            with transaction.atomic():
+                # Claim, then count: as in submit(), the UPDATE holds the
+                # write lock, so two workers cannot both take the last slot.
+                now = timezone.now()
+                claimed = AnalysisJob.objects.filter(id=job_id, status=AnalysisJob.QUEUED).update(
+                    status=AnalysisJob.RUNNING, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+                )
+                if not claimed:  # Another worker took it first
+                    continue
+                if AnalysisJob.objects.filter(status=AnalysisJob.RUNNING).count() > max_running:
+                    raise _NoSlot()
+        except _NoSlot:
+            return None
+        return AnalysisJob.objects.get(id=job_id)
+    return None
+
+
+def _heartbeat(job, stop):
+    """Renew the job's lease until stop is set. Runs in its own thread."""
+    try:
+        while not stop.wait(_setting('TASK_JOB_LEASE_SECONDS') / 3):
+            _owned(job).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def _owned(job):
+    """The job's row, as long as this attempt still owns it (not requeued meanwhile)."""
+    return AnalysisJob.objects.filter(id=job.id, status=AnalysisJob.RUNNING, attempts=job.attempts)
+
+
+def run(job):
+    """Run the analyze pipeline for a claimed job and record the outcome."""
+    last_reported = [0.0]
+
+    def progress(fraction):
+        if fraction - last_reported[0] >= PROGRESS_STEP:
+            last_reported[0] = fraction
+            _owned(job).update(progress=round(fraction, 3))
+
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job, stop), name=f'analysis-job-heartbeat-{job.id}', daemon=True).start()
+    try:
+        _analyze(job, progress)
+    finally:
+        stop.set()
+
+    now = timezone.now()
+    job.progress = 1
+    job.payload = b''  # No longer needed; keeps the table small
+    job.finished_at = now
+    job.expires_at = now + timedelta(seconds=_setting('TASK_JOB_RESULT_TTL'))
+    # Only if the lease was not lost meanwhile; otherwise another worker owns the job now.
+    fields = ['status', 'result', 'analysis_id', 'progress', 'payload', 'finished_at', 'expires_at']
+    _owned(job).update(**{name: getattr(job, name) for name in fields})
+
+
+def _analyze(job, progress):
+    """Set job.status/result/analysis_id from running the analyze pipeline."""
+    options = job.options
+    explain = options.get('explain', True)
+    try:
+        data = _parsers()[job.content_type]().parse(io.BytesIO(bytes(job.payload)))
+        if isinstance(data, TaskColumns):
+            # Columnar analyses are not stored, as in AnalyzeTasksView.
+            results, analysis_id = analyze_columns(data, explain=explain), None
+        else:
+            results, analysis_id = analyze_tasks(data, progress=progress, explain=explain, keep=options.get('keep', False))
+        job.status = AnalysisJob.DONE
+        job.result = json.dumps(select_fields(results, options.get('fields')), default=str)
+        job.analysis_id = analysis_id or ''
+    except AnalysisError as exc:
+        job.status = AnalysisJob.FAILED
+        job.result = json.dumps(exc.detail)
+    except ParseError as exc:
+        job.status = AnalysisJob.FAILED
+        job.result = json.dumps({"detail": str(exc.detail)})
+    except Exception:
+        logger.exception("Analysis job %s crashed", job.id)
+        job.status = AnalysisJob.FAILED
+        job.result = json.dumps({"error": "Internal error while analyzing tasks."})
+
+
+def process_next():
+    """Claim and run one job. Returns the job, or None if none was ready."""
+    job = claim_next()
+    if job is not None:
+        run(job)
+    return job
+
+
+def purge_expired():
+    """Delete finished jobs whose results have expired."""
+    finished = AnalysisJob.objects.filter(status__in=[AnalysisJob.DONE, AnalysisJob.FAILED])
+    return finished.filter(expires_at__lt=timezone.now()).delete()[0]
+
+
+class WorkerPool:
+    """In-process worker threads that drain the AnalysisJob queue."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    def start(self, **kwargs):
+        """Start the worker threads once. Also connected to request_started, hence **kwargs."""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(_setting('TASK_JOB_WORKERS')):
+                thread = threading.Thread(target=self._loop, name=f'analysis-job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _loop(self):
+        while True:
+            close_old_connections()
+            try:
+                job = process_next()
+                if job is None:
+                    purge_expired()
+            except Exception:
+                logger.exception("Analysis job worker error")
+                job = None
+            if job is None:
+                self._wakeup.wait(_setting('TASK_JOB_POLL_INTERVAL'))
+                self._wakeup.clear()
+
+
+pool = WorkerPool()
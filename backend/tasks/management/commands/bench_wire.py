@@ -0,0 +1,97 @@
+import io
+import json
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.test import APIRequestFactory
+
+from tasks.columns import validate_columns
+from tasks.parsers import ArrowStreamParser, MessagePackParser, msgpack, pa
+from tasks.renderers import to_columns
+from tasks.serializers import TaskAnalysisSerializer
+from tasks.views import AnalyzeTasksView
+
+
+def _make_tasks(n, seed=0):
+    rng = random.Random(seed)
+    today = date.today()
+    return [
+        {
+            'id': i,
+            'title': f"Task {i}",
+            'due_date': str(today + timedelta(days=rng.randint(-10, 60))),
+            'estimated_hours': rng.randint(1, 30),
+            'importance': rng.randint(1, 10),
+            'dependencies': rng.sample(range(1, i), min(i - 1, rng.randint(0, 2))) if i > 1 else [],
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _arrow_body(tasks):
+    columns = to_columns(tasks)
+    columns['due_date'] = [date.fromisoformat(d) for d in columns['due_date']]
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class Command(BaseCommand):
+    help = "Compare JSON with the binary columnar formats for AnalyzeTasksView: parse time, response size, peak memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=100_000, help='Number of tasks per request.')
+
+    # Measure the inline path even for payloads that would normally be queued.
+    @override_settings(TASK_JOB_THRESHOLD_BYTES=2 ** 62, DATA_UPLOAD_MAX_MEMORY_SIZE=None)
+    def handle(self, *args, **options):
+        tasks = _make_tasks(options['tasks'])
+        formats = [('json', 'application/json', json.dumps(tasks).encode(), JSONParser)]
+        if msgpack is not None:
+            formats.append(('msgpack', MessagePackParser.media_type, msgpack.packb(to_columns(tasks)), MessagePackParser))
+        if pa is not None:
+            formats.append(('arrow', ArrowStreamParser.media_type, _arrow_body(tasks), ArrowStreamParser))
+        if len(formats) == 1:
+            self.stderr.write("Neither msgpack nor pyarrow is installed; only JSON will be measured.")
+
+        factory = APIRequestFactory()
+        view = AnalyzeTasksView.as_view()
+
+        self.stdout.write(f"{len(tasks)} tasks")
+        self.stdout.write(f"{'format':>8} {'request':>10} {'parse+validate':>15} {'end-to-end':>11} {'response':>10} {'peak mem':>10}")
+        for name, content_type, body, parser_class in formats:
+            # Parsing plus the validation each path needs before scoring.
+            started = time.perf_counter()
+            parsed = parser_class().parse(io.BytesIO(body))
+            if name == 'json':
+                TaskAnalysisSerializer(data=parsed, many=True).is_valid(raise_exception=True)
+            else:
+                validate_columns(parsed.columns)
+            parse_time = time.perf_counter() - started
+
+            def request():
+                response = view(factory.post('/api/tasks/analyze/', body, content_type=content_type, HTTP_ACCEPT=content_type))
+                response.render()
+                assert response.status_code == 200, response.content[:200]
+                return response
+
+            started = time.perf_counter()
+            response = request()
+            total_time = time.perf_counter() - started
+
+            tracemalloc.start()
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{name:>8} {len(body) / 1e6:>8.1f}MB {parse_time:>14.2f}s {total_time:>10.2f}s "
+                f"{len(response.content) / 1e6:>8.1f}MB {peak / 1e6:>8.0f}MB"
+            )
@@ -0,0 +1,32 @@
+import glob
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from tasks import graph_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove the shared-memory dependency graph segments and lock file (see tasks/graph_cache.py). "
+        "Run it once no server is using them, e.g. after stopping the last server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Also remove task-graph-* segments and lock files of other namespaces (Linux /dev/shm only).',
+        )
+
+    def handle(self, *args, **options):
+        graph_cache.cleanup()
+        self.stdout.write(f"Removed graph cache namespace {graph_cache._namespace()}")
+        if options['all']:
+            paths = glob.glob('/dev/shm/task-graph-*') + glob.glob(os.path.join(tempfile.gettempdir(), 'task-graph-*.lock'))
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            self.stdout.write(f"Removed {len(paths)} other segment(s) and lock file(s)")
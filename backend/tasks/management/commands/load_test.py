@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _int_list(value, option):
+    try:
+        return [int(v) for v in value.split(',')]
+    except ValueError as exc:
+        raise CommandError(f"{option} must be a comma-separated list of integers") from exc
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure GET throughput, e.g. of /api/tasks/suggest/. With --servers, start "
+        "that many single-threaded server processes for each level and spread requests "
+        "across them, to check that throughput scales with server workers. Without it, "
+        "hit --url on an already running server at each --concurrency level."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/tasks/suggest/', help='Endpoint to request.')
+        parser.add_argument('--concurrency', default='1,2,4,8', help='Comma-separated client thread counts to try.')
+        parser.add_argument('--servers', help='Comma-separated server process counts to try, e.g. 1,2,4.')
+        parser.add_argument('--port', type=int, default=8100, help='First port for --servers processes.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per level.')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Per-request timeout in seconds.')
+
+    def handle(self, *args, **options):
+        self.total = options['requests']
+        self.timeout = options['timeout']
+        if options['servers']:
+            self.scale_servers(options)
+            return
+
+        self.stdout.write(f"{'clients':>8} {'req/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for clients in _int_list(options['concurrency'], '--concurrency'):
+            self.report(clients, [options['url']], clients)
+
+    def scale_servers(self, options):
+        levels = _int_list(options['servers'], '--servers')
+        path = '/' + options['url'].split('://', 1)[-1].split('/', 1)[-1]
+        self.stdout.write(f"{'servers':>8} {'req/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for servers in levels:
+            ports = range(options['port'], options['port'] + servers)
+            processes = [self.start_server(port) for port in ports]
+            try:
+                urls = [f'http://127.0.0.1:{port}{path}' for port in ports]
+                for url in urls:
+                    self.wait_until_up(url)
+                # Two clients per server keep every process busy.
+                self.report(servers, urls, 2 * servers)
+            finally:
+                for process in processes:
+                    process.terminate()
+                for process in processes:
+                    process.wait()
+
+    def start_server(self, port):
+        manage = os.path.join(settings.BASE_DIR, 'manage.py')
+        return subprocess.Popen(
+            [sys.executable, manage, 'runserver', '--noreload', '--nothreading', f'127.0.0.1:{port}'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def wait_until_up(self, url, attempts=50):
+        for _ in range(attempts):
+            if self.fetch(url)[0]:
+                return
+            time.sleep(0.2)
+        raise CommandError(f"Server at {url} did not start")
+
+    def fetch(self, url):
+        start = time.perf_counter()
+        try:
+            with urlopen(url, timeout=self.timeout) as response:
+                response.read()
+                ok = response.status == 200
+        except (URLError, OSError):
+            ok = False
+        return ok, time.perf_counter() - start
+
+    def report(self, label, urls, clients):
+        # Warm up persistent connections on the server side.
+        for url in urls:
+            self.fetch(url)
+
+        targets = cycle(urls)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(self.fetch, [next(targets) for _ in range(self.total)]))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _, latency in results)
+        errors = sum(1 for ok, _ in results if not ok)
+        p50 = latencies[len(latencies) // 2] * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        self.stdout.write(f"{label:>8} {self.total / elapsed:>10.1f} {p50:>8.1f} {p95:>8.1f} {errors:>7}")
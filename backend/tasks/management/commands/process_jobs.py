@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks import jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued analyze jobs. Run it next to the web server unless TASK_JOB_WORKERS is set."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit instead of polling forever.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            job = jobs.process_next()
+            if job is not None:
+                self.stdout.write(f"Job {job.id}: {job.status}")
+                continue
+            purged = jobs.purge_expired()
+            if purged:
+                self.stdout.write(f"Purged {purged} expired job(s)")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
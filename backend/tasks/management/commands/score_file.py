@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.batch import DEFAULT_CHUNK_SIZE, detect_format, rank_file, top_k
+
+
+class Command(BaseCommand):
+    help = "Score a large NDJSON or CSV export of tasks and write them ranked by priority score."
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Path to an .ndjson or .csv file of tasks.')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Input format (default: guessed from the extension).')
+        parser.add_argument('--output', '-o', help='Write the full ranking to this file instead of stdout.')
+        parser.add_argument('--top', type=int, help='Only write the K highest-scoring tasks to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Bytes read per chunk (default: 8 MiB).')
+
+    def handle(self, *args, **options):
+        path = options['input']
+        fmt = options['format'] or detect_format(path)
+        chunk_size = options['chunk_size']
+
+        try:
+            if options['top'] is not None:
+                for task in top_k(path, options['top'], fmt, chunk_size):
+                    self.stdout.write(json.dumps(task, default=str))
+                return
+
+            if options['output']:
+                with open(options['output'], 'w', encoding='utf-8') as out:
+                    written = rank_file(path, out, fmt, chunk_size)
+                self.stderr.write(f"Wrote {written} ranked tasks to {options['output']}")
+            else:
+                rank_file(path, self.stdout, fmt, chunk_size)
+        except FileNotFoundError as exc:
+            raise CommandError(f"Input file not found: {path}") from exc
+        except (ValueError, TypeError, KeyError) as exc:
+            raise CommandError(f"Could not parse {path}: {exc}") from exc
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 class Task(models.Model):
@@ -12,3 +14,38 @@ class Task(models.Model):
     
     def __str__(self):
         return self.title
+
+class AnalysisJob(models.Model):
+    """An oversized analyze request queued for the background worker pool (see tasks/jobs.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    # The raw request body, in the format named by content_type.
+    payload = models.BinaryField()
+    content_type = models.CharField(max_length=100, default='application/json')
+    payload_bytes = models.PositiveIntegerField()
+    # Request options: {"keep": bool, "fields": [...] or null, "explain": bool}
+    options = models.JSONField(default=dict, blank=True)
+    progress = models.FloatField(default=0)
+    # JSON text: the ranked results when done, the 400 response body when failed.
+    result = models.TextField(blank=True)
+    analysis_id = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Renewed by the worker while it runs the job; a stale heartbeat means the worker died.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Set when the job finishes; queued and running jobs never expire.
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
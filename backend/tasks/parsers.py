@@ -0,0 +1,77 @@
+"""
+Binary columnar request parsers for AnalyzeTasksView.
+
+Both parsers return a TaskColumns batch instead of a list of task dicts, so
+the view can skip JSON decoding and per-field DRF conversion. Each depends on
+an optional package and is only offered when that package is installed:
+
+- MessagePackParser (application/msgpack) needs `msgpack`; the body is a map
+  of column name -> array.
+- ArrowStreamParser (application/vnd.apache.arrow.stream) needs `pyarrow`;
+  the body is an Arrow IPC stream with one column per task field.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .columns import TaskColumns
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional dependency
+    pa = None
+
+# memoryview formats for Arrow primitive types that can be read in place.
+ARROW_BUFFER_FORMATS = {'int64': 'q', 'int32': 'i', 'double': 'd', 'float': 'f'}
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            data = msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
+        if not isinstance(data, dict) or not all(isinstance(v, list) for v in data.values()):
+            raise ParseError("Expected a map of column name to array.")
+        return TaskColumns(data)
+
+
+def _arrow_column(column):
+    """
+    Expose an Arrow column as a Python sequence. Null-free primitive columns
+    are returned as a memoryview over the Arrow buffer (no copy); anything
+    else is converted with to_pylist().
+    """
+    array = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+    fmt = ARROW_BUFFER_FORMATS.get(str(array.type))
+    if fmt is None or array.null_count:
+        return array.to_pylist()
+    view = memoryview(array.buffers()[1]).cast(fmt)
+    return view[array.offset:array.offset + len(array)]
+
+
+class ArrowStreamParser(BaseParser):
+    media_type = 'application/vnd.apache.arrow.stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            table = pa.ipc.open_stream(stream.read()).read_all()
+        except (pa.ArrowInvalid, OSError) as exc:
+            raise ParseError(f"Arrow stream parse error - {exc}")
+        return TaskColumns({name: _arrow_column(table.column(name)) for name in table.column_names})
+
+
+def binary_parsers():
+    """The binary parsers whose optional dependency is installed."""
+    parsers = []
+    if msgpack is not None:
+        parsers.append(MessagePackParser)
+    if pa is not None:
+        parsers.append(ArrowStreamParser)
+    return parsers
@@ -0,0 +1,73 @@
+"""
+Binary columnar response renderers, the counterparts of tasks/parsers.py.
+
+Lists of task dicts are transposed into columns before encoding; results that
+are already columnar (from the binary analyze path) are encoded as-is. Like
+the parsers, each renderer is only offered when its package is installed.
+"""
+import json
+from datetime import date
+
+from rest_framework.renderers import BaseRenderer
+
+from .parsers import msgpack, pa
+
+
+def to_columns(data):
+    """Turn a list of row dicts into {name: [values]}; other data is returned unchanged."""
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        return data
+    names = []
+    for row in data:
+        for name in row:
+            if name not in names:
+                names.append(name)
+    return {name: [row.get(name) for row in data] for name in names}
+
+
+def _encode_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(to_columns(data), default=_encode_default, use_bin_type=True)
+
+
+class ArrowStreamRenderer(BaseRenderer):
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        columns = to_columns(data)
+        if not isinstance(columns, dict) or not all(isinstance(v, list) for v in columns.values()):
+            # Errors and other non-tabular bodies travel as a single JSON cell.
+            columns = {'error': [json.dumps(data, default=_encode_default)]}
+        table = pa.table(columns)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def binary_renderers():
+    """The binary renderers whose optional dependency is installed."""
+    renderers = []
+    if msgpack is not None:
+        renderers.append(MessagePackRenderer)
+    if pa is not None:
+        renderers.append(ArrowStreamRenderer)
+    return renderers
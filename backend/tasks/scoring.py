@@ -1,10 +1,30 @@
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 
-def calculate_priority_score(task, all_tasks_map):
+def business_days(start, end):
+    """Business days in [start, end) per the configured holiday calendar (see tasks/holidays.py)."""
+    # Imported on first use so `import tasks.scoring` stays as cheap as possible.
+    from .holidays import business_days as calendar_business_days
+    return calendar_business_days(start, end)
+
+def count_dependents(tasks):
+    """
+    Count, for every task id, how many tasks list it as a dependency.
+    Returns a dict of {id: count}; ids nothing depends on are omitted.
+    """
+    counts = {}
+    for t in tasks:
+        # A task listing the same dependency twice still blocks on it once.
+        for dep_id in set(t.get('dependencies', [])):
+            counts[dep_id] = counts.get(dep_id, 0) + 1
+    return counts
+
+def calculate_priority_score(task, all_tasks_map, dependents_count=None):
     """
     Calculate priority score for a single task.
     task: dict containing task details
     all_tasks_map: dict of {id: task_dict} for looking up relationships
+    dependents_count: Optional precomputed number of tasks blocked by this one
+                      (see count_dependents). Skips the scan of all_tasks_map.
     """
     score = 0
     
@@ -19,28 +39,38 @@ def calculate_priority_score(task, all_tasks_map):
 
     today = date.today()
     
-    def get_business_days(start, end):
-        """Calculate business days between start and end date (inclusive-ish)."""
-        if start > end:
-            return (end - start).days # Return negative calendar days for overdue
-            
-        days = 0
-        current = start
-        # Hardcoded holidays for demonstration (Month-Day)
-        holidays = ["01-01", "12-25", "07-04"] 
+    # Business days (weekends and configured holidays skipped); negative
+    # calendar days when overdue.
+    days_until_due = business_days(today, due_date)
+    
+    importance = float(task.get('importance', 5))
+    
+    try:
+        hours = float(task.get('estimated_hours', 0))
+    except (ValueError, TypeError):
+        hours = 0
+        
+    # If this task blocks others, it's important.
+    task_id = task.get('id')
+    if not task_id:
+        dependents_count = 0
+    elif dependents_count is None:
+        dependents_count = 0
+        for other_task in all_tasks_map.values():
+            deps = other_task.get('dependencies', [])
+            if task_id in deps:
+                dependents_count += 1
         
-        while current < end:
-            # 0=Monday, 6=Sunday. Skip 5 (Sat) and 6 (Sun)
-            if current.weekday() < 5:
-                # Check holiday
-                md = current.strftime("%m-%d")
-                if md not in holidays:
-                    days += 1
-            current += timedelta(days=1)
-        return days
-
-    days_until_due = get_business_days(today, due_date)
+    return priority_score(days_until_due, importance, hours, dependents_count)
+
+def priority_score(days_until_due, importance, hours, dependents_count):
+    """
+    The scoring rules on already-extracted values. calculate_priority_score
+    wraps this for task dicts; columnar callers use it directly.
+    """
+    score = 0
     
+    # 1. Urgency
     if days_until_due < 0:
         score += 40 # Overdue - High Priority
     elif days_until_due == 0:
@@ -51,15 +81,9 @@ def calculate_priority_score(task, all_tasks_map):
         score += 10 # Due in <= 1 business week (5 days)
     
     # 2. Importance (1-10)
-    importance = float(task.get('importance', 5))
     score += importance * 3 # Weight importance
     
     # 3. Effort (Quick Wins)
-    try:
-        hours = float(task.get('estimated_hours', 0))
-    except (ValueError, TypeError):
-        hours = 0
-        
     if hours > 0 and hours <= 2:
         score += 15 # Quick win
     elif hours <= 5:
@@ -68,16 +92,7 @@ def calculate_priority_score(task, all_tasks_map):
         score -= 5 # De-prioritize very large tasks slightly to favor momentum
         
     # 4. Dependencies (Blockers rank higher)
-    # If this task blocks others, it's important.
-    task_id = task.get('id')
-    if task_id:
-        dependents_count = 0
-        for other_task in all_tasks_map.values():
-            deps = other_task.get('dependencies', [])
-            if task_id in deps:
-                dependents_count += 1
-        
-        score += dependents_count * 15 # Significant boost for blockers
+    score += dependents_count * 15 # Significant boost for blockers
         
     return round(score, 2)
 
@@ -166,54 +181,148 @@ def detect_cycles(tasks, dependency_fetcher=None):
             
     return False
 
-def get_score_explanation(task, score, all_tasks_map):
-    """Generate a human-readable explanation for the score."""
-    explanations = []
-    
+def creates_cycle(graph, new_edges, dependency_fetcher=None):
+    """
+    Check whether new dependency edges close a cycle in an otherwise acyclic graph.
+    Cheaper than detect_cycles after a small edit: only the part of the graph
+    reachable from the new edges is visited.
+
+    graph: dict of {id: [dependency ids]}, already including the new edges.
+    new_edges: iterable of (task_id, dependency_id) pairs that were added.
+    dependency_fetcher: Same as for detect_cycles; called for ids missing from graph.
+    """
+    known = dict(graph)
+    fetched = set()
+    for task_id, dep_id in new_edges:
+        # A new edge task -> dep closes a cycle iff task is reachable from dep.
+        if task_id == dep_id:
+            return True
+        seen = {dep_id}
+        frontier = [dep_id]
+        while frontier:
+            missing = [n for n in frontier if n not in known and n not in fetched]
+            if dependency_fetcher and missing:
+                fetched.update(missing)
+                for t in dependency_fetcher(missing):
+                    known.setdefault(t.get('id'), t.get('dependencies', []))
+
+            next_frontier = []
+            for node in frontier:
+                for neighbor in known.get(node, []):
+                    if neighbor == task_id:
+                        return True
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+    return False
+
+def get_score_explanation(task, score, all_tasks_map, dependents_count=None):
+    """
+    Generate a human-readable explanation for the score.
+    dependents_count: Optional precomputed number of tasks blocked by this one.
+    """
     # Urgency
     try:
         if isinstance(task['due_date'], str):
             due_date = datetime.strptime(task['due_date'], '%Y-%m-%d').date()
         else:
             due_date = task['due_date']
-            
-        # Re-use the business days logic (ideally refactor to shared function, but duplicating for safety in this snippet)
-        def get_bd(start, end):
-            if start > end: return (end - start).days
-            days = 0
-            current = start
-            holidays = ["01-01", "12-25", "07-04"] 
-            while current < end:
-                if current.weekday() < 5 and current.strftime("%m-%d") not in holidays:
-                    days += 1
-                current += timedelta(days=1)
-            return days
-
-        days_until_due = get_bd(date.today(), due_date)
-        
-        if days_until_due < 0:
-            explanations.append(f"Overdue by {abs(days_until_due)} days")
-        elif days_until_due == 0:
-            explanations.append("Due today")
-        else:
-            explanations.append(f"Due in {days_until_due} business days")
+
+        days_until_due = business_days(date.today(), due_date)
     except:
+        days_until_due = None
+
+    # Dependencies
+    task_id = task.get('id')
+    if not task_id:
+        dependents_count = 0
+    elif dependents_count is None:
+        dependents_count = sum(1 for t in all_tasks_map.values() if task_id in t.get('dependencies', []))
+
+    return explain_score(
+        days_until_due,
+        float(task.get('importance', 0)),
+        float(task.get('estimated_hours', 0)),
+        dependents_count,
+    )
+
+def explain_score(days_until_due, importance, hours, dependents_count):
+    """Explanation text from already-extracted values; days_until_due may be None if unknown."""
+    explanations = []
+    
+    if days_until_due is None:
         pass
+    elif days_until_due < 0:
+        explanations.append(f"Overdue by {abs(days_until_due)} days")
+    elif days_until_due == 0:
+        explanations.append("Due today")
+    else:
+        explanations.append(f"Due in {days_until_due} business days")
 
-    # Importance
-    if float(task.get('importance', 0)) >= 8:
+    if importance >= 8:
         explanations.append("High importance")
         
-    # Effort
-    hours = float(task.get('estimated_hours', 0))
     if hours <= 2:
         explanations.append("Quick win")
         
-    # Dependencies
-    task_id = task.get('id')
-    if task_id:
-        dependents = [t['title'] for t in all_tasks_map.values() if task_id in t.get('dependencies', [])]
-        if dependents:
-            explanations.append(f"Blocks {len(dependents)} task(s)")
+    if dependents_count:
+        explanations.append(f"Blocks {dependents_count} task(s)")
 
     return ", ".join(explanations) if explanations else "Standard priority"
+
+def main(argv=None):
+    """
+    Command-line entry point so batch workers can score task lists without
+    booting Django:
+
+        python -m tasks.scoring score input.ndjson [--top N]
+
+    Reads one task object per line ('-' for stdin) and writes the ranked
+    tasks back out as NDJSON with 'score' and 'explanation' added.
+    """
+    # Imported lazily so `import tasks.scoring` stays as cheap as possible.
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(prog='python -m tasks.scoring')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    score_parser = subparsers.add_parser('score', help='Score an NDJSON file of tasks.')
+    score_parser.add_argument('input', help="Path to an NDJSON file, or '-' for stdin.")
+    score_parser.add_argument('--top', type=int, default=None, help='Only output the N highest-scoring tasks.')
+    score_parser.add_argument('--holidays', help='Holiday calendar JSON file (default: built-in holidays).')
+    score_parser.add_argument('--region', default=None, help='Region to use from the holiday file.')
+    args = parser.parse_args(argv)
+
+    if args.holidays:
+        from . import holidays
+        holidays.configure(args.holidays, args.region)
+
+    stream = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    try:
+        tasks = [json.loads(line) for line in stream if line.strip()]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    if detect_cycles(tasks):
+        print("Circular dependencies detected. Please resolve dependencies before analyzing.", file=sys.stderr)
+        return 1
+
+    tasks_map = {t.get('id'): t for t in tasks if t.get('id') is not None}
+    dependents = count_dependents(tasks_map.values())
+    for task in tasks:
+        count = dependents.get(task.get('id'), 0)
+        task['score'] = calculate_priority_score(task, tasks_map, dependents_count=count)
+        task['explanation'] = get_score_explanation(task, task['score'], tasks_map, dependents_count=count)
+    tasks.sort(key=lambda x: x['score'], reverse=True)
+
+    if args.top is not None:
+        tasks = tasks[:args.top]
+    for task in tasks:
+        sys.stdout.write(json.dumps(task, default=str) + '\n')
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
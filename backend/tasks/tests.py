@@ -1,10 +1,43 @@
 from django.test import TestCase
 from django.urls import reverse
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
 from datetime import date, timedelta
-from .scoring import calculate_priority_score, detect_cycles
-from .models import Task
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.utils import timezone
+from . import graph_cache, holidays, jobs
+from .analysis import locked_analysis
+from .batch import count_blockers, top_k
+from .db import ReadReplicaRouter, use_read_replica
+from .holidays import HolidayCalendar
+from .parsers import msgpack, pa
+from .renderers import to_columns
+from .scoring import calculate_priority_score, count_dependents, creates_cycle, detect_cycles, main as scoring_main
+from .models import AnalysisJob, Task
+
+# Keep the shared-memory graph cache of this test run away from any running
+# server's, and remove its segments afterwards.
+_graph_cache_settings = override_settings(TASK_GRAPH_CACHE_NAME=f'task-graph-test-{os.getpid()}')
+
+
+def setUpModule():
+    _graph_cache_settings.enable()
+
+
+def tearDownModule():
+    graph_cache.cleanup()
+    _graph_cache_settings.disable()
+
 
 class ScoringLogicTests(TestCase):
     def test_urgency_scoring(self):
@@ -122,6 +155,16 @@ class ScoringLogicTests(TestCase):
             
         self.assertFalse(detect_cycles(tasks_ok, dependency_fetcher=mock_fetcher_ok))
 
+    def test_creates_cycle(self):
+        graph = {1: [2], 2: [3], 3: [1]}
+        self.assertTrue(creates_cycle(graph, [(3, 1)]))
+        self.assertFalse(creates_cycle({1: [2], 2: [3], 3: []}, [(1, 2)]))
+
+        # 3 -> 1 only closes a cycle through a task that lives in the DB.
+        def mock_fetcher(ids):
+            return [{'id': 4, 'dependencies': [3]}] if 4 in ids else []
+        self.assertTrue(creates_cycle({1: [4], 3: [1]}, [(3, 1)], dependency_fetcher=mock_fetcher))
+
     def test_cycle_detection_with_missing_dependency(self):
         # Task 1 depends on 999 (which doesn't exist)
         tasks = [{'id': 1, 'dependencies': [999]}]
@@ -133,7 +176,180 @@ class ScoringLogicTests(TestCase):
         # Should not hang and should return False (no cycle)
         self.assertFalse(detect_cycles(tasks, dependency_fetcher=mock_fetcher_missing))
 
+class HolidayCalendarTests(TestCase):
+    def test_default_holidays_skipped(self):
+        cal = HolidayCalendar()
+        # Wed 2025-12-24 -> Fri 2025-12-26: only the 24th counts, the 25th is a holiday.
+        self.assertEqual(cal.business_days(date(2025, 12, 24), date(2025, 12, 26)), 1)
+        # Fri 2026-01-02 -> Mon 2026-01-05 skips the weekend.
+        self.assertEqual(cal.business_days(date(2026, 1, 2), date(2026, 1, 5)), 1)
+        # Overdue returns negative calendar days.
+        self.assertEqual(cal.business_days(date(2026, 1, 5), date(2026, 1, 1)), -4)
+
+    def test_observed_rule(self):
+        # 2026-07-04 is a Saturday, so it is observed on Friday 07-03.
+        cal = HolidayCalendar([{'date': '07-04', 'observed': True}])
+        self.assertFalse(cal.is_business_day(date(2026, 7, 3)))
+        self.assertEqual(cal.business_days(date(2026, 6, 29), date(2026, 7, 6)), 4)
+        # 2022-01-01 is a Saturday, observed on Friday 2021-12-31.
+        new_year = HolidayCalendar([{'date': '01-01', 'observed': True}])
+        self.assertFalse(new_year.is_business_day(date(2021, 12, 31)))
+
+    def test_span_grows_for_distant_dates(self):
+        cal = HolidayCalendar([])
+        self.assertEqual(cal.business_days(date(1990, 1, 1), date(1990, 1, 8)), 5)
+        self.assertEqual(cal.business_days(date(2090, 1, 2), date(2090, 1, 9)), 5)
+
+    def test_file_reload(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'regions': {'XX': ['2026-03-03']}}, f)
+        self.addCleanup(os.unlink, f.name)
+        holidays.configure(f.name, 'XX')
+        self.addCleanup(holidays.configure)
+
+        start, end = date(2026, 3, 2), date(2026, 3, 5)
+        self.assertEqual(holidays.business_days(start, end), 2)
+
+        with open(f.name, 'w') as f2:
+            json.dump({'regions': {'XX': []}}, f2)
+        os.utime(f.name, (0, 0))
+        holidays.reload()
+        self.assertEqual(holidays.business_days(start, end), 3)
+
+        # A broken edit keeps the last good calendar instead of failing requests.
+        with open(f.name, 'w') as f2:
+            f2.write('{"regions": ')
+        os.utime(f.name, (1, 1))
+        holidays.reload()
+        with self.assertLogs('tasks.holidays', 'WARNING'):
+            self.assertEqual(holidays.business_days(start, end), 3)
+
+        with self.assertRaises(FileNotFoundError):
+            holidays.configure(f.name + '.missing', 'XX')
+
+    def test_extreme_dates(self):
+        cal = HolidayCalendar()
+        self.assertGreater(cal.business_days(date.today(), date(9999, 12, 31)), 2_000_000)
+        # The compiled span stays bounded however far out the date is.
+        self.assertLessEqual(cal._span[2], date.today().year + holidays.MAX_SPAN_YEARS)
+        self.assertEqual(len(cal.year_bitmap(9999)), 365)
+        # Beyond the span, weekdays still count: Mon 9999-12-20 -> Mon 9999-12-27.
+        self.assertEqual(cal.business_days(date(9999, 12, 20), date(9999, 12, 27)), 5)
+
+        task = {"title": "Far", "due_date": "9999-12-31", "estimated_hours": 1, "importance": 5}
+        response = APIClient().post(reverse('analyze-tasks'), [task], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class ScoringCLITests(TestCase):
+    def test_score_command_ranks_ndjson(self):
+        tasks = [
+            {'id': 1, 'title': 'A', 'due_date': str(date.today() + timedelta(days=30)), 'estimated_hours': 3, 'importance': 2, 'dependencies': []},
+            {'id': 2, 'title': 'B', 'due_date': str(date.today()), 'estimated_hours': 3, 'importance': 9, 'dependencies': []},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            for t in tasks:
+                f.write(json.dumps(t) + '\n')
+        self.addCleanup(os.unlink, f.name)
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            exit_code = scoring_main(['score', f.name, '--top', '1'])
+
+        self.assertEqual(exit_code, 0)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['id'], 2)
+
+class BatchScoringTests(TestCase):
+    def setUp(self):
+        today = date.today()
+        self.tasks = [
+            {'id': 1, 'title': 'A', 'due_date': str(today + timedelta(days=30)), 'estimated_hours': 8, 'importance': 5, 'dependencies': []},
+            {'id': 2, 'title': 'B', 'due_date': str(today + timedelta(days=30)), 'estimated_hours': 8, 'importance': 5, 'dependencies': [1]},
+            {'id': 3, 'title': 'C', 'due_date': str(today + timedelta(days=30)), 'estimated_hours': 8, 'importance': 5, 'dependencies': [1, 2]},
+            {'id': 4, 'title': 'D', 'due_date': str(today), 'estimated_hours': 1, 'importance': 9, 'dependencies': []},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            for t in self.tasks:
+                f.write(json.dumps(t) + '\n')
+        self.path = f.name
+        self.addCleanup(os.unlink, self.path)
+
+    def expected_ranking(self):
+        tasks_map = {t['id']: t for t in self.tasks}
+        ranked = sorted(self.tasks, key=lambda t: calculate_priority_score(t, tasks_map), reverse=True)
+        return [t['id'] for t in ranked]
+
+    def test_count_blockers(self):
+        counts = count_blockers(self.path, chunk_size=16)
+        self.assertEqual(counts[1], 2)
+        self.assertEqual(counts[2], 1)
+
+    def _write(self, tasks):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            for t in tasks:
+                f.write(json.dumps(t) + '\n')
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def test_repeated_dependency_counts_once(self):
+        self.tasks[1]['dependencies'] = [1, 1]
+        counts = count_blockers(self._write(self.tasks))
+        self.assertEqual(counts[1], 2)  # Tasks 2 and 3, not three entries
+        self.assertEqual(count_dependents(self.tasks)[1], 2)
+
+    def test_sparse_ids_do_not_allocate_by_id(self):
+        self.tasks[1]['dependencies'] = [3_000_000_000]
+        counts = count_blockers(self._write(self.tasks))
+        self.assertIsInstance(counts, dict)
+        self.assertEqual((counts[3_000_000_000], counts[1]), (1, 1))
+
+    def test_csv_quoted_newlines_and_numbers(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'title', 'due_date', 'estimated_hours', 'importance', 'dependencies'])
+            for t in self.tasks:
+                writer.writerow([t['id'], f"{t['title']}, multi\nline", t['due_date'], t['estimated_hours'], t['importance'],
+                                 ';'.join(str(d) for d in t['dependencies'])])
+        self.addCleanup(os.unlink, f.name)
+
+        # A tiny chunk size splits the file after every record.
+        top = top_k(f.name, 4, chunk_size=16)
+        self.assertEqual([t['id'] for t in top], self.expected_ranking())
+        task = next(t for t in top if t['id'] == 1)
+        self.assertEqual(task['title'], "A, multi\nline")
+        self.assertEqual((task['estimated_hours'], task['importance']), (8, 5))
+
+    def test_invalid_dependency_id(self):
+        self.tasks[1]['dependencies'] = ["1"]
+        with self.assertRaises(CommandError):
+            call_command('score_file', self._write(self.tasks), stdout=io.StringIO())
+
+    def test_score_file_matches_in_memory_scoring(self):
+        out = io.StringIO()
+        # A tiny chunk size forces several sorted runs to be merged.
+        call_command('score_file', self.path, '--chunk-size', '16', stdout=out)
+        ranked = [json.loads(line)['id'] for line in out.getvalue().splitlines()]
+        self.assertEqual(ranked, self.expected_ranking())
+
+    def test_top_k(self):
+        top = top_k(self.path, 2, chunk_size=16)
+        self.assertEqual([t['id'] for t in top], self.expected_ranking()[:2])
+
+    def test_csv_input(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('id,title,due_date,estimated_hours,importance,dependencies\n')
+            for t in self.tasks:
+                deps = ';'.join(str(d) for d in t['dependencies'])
+                f.write(f"{t['id']},{t['title']},{t['due_date']},{t['estimated_hours']},{t['importance']},{deps}\n")
+        self.addCleanup(os.unlink, f.name)
+
+        top = top_k(f.name, 4, chunk_size=16)
+        self.assertEqual([t['id'] for t in top], self.expected_ranking())
+
 class APITests(TestCase):
+    databases = {'default', 'replica'}
+
     def setUp(self):
         self.client = APIClient()
         self.url = reverse('analyze-tasks')
@@ -200,3 +416,412 @@ class APITests(TestCase):
         # Cycle: B -> A -> B
         response = self.client.post(self.url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_analyze_sparse_fields(self):
+        data = [
+            { "id": 1, "title": "Task 1", "due_date": str(date.today()), "estimated_hours": 3, "importance": 8, "dependencies": [] },
+            { "id": 2, "title": "Task 2", "due_date": str(date.today()), "estimated_hours": 3, "importance": 5, "dependencies": [1] }
+        ]
+        full = self.client.post(self.url, data, format='json').data
+        sparse = self.client.post(self.url + '?fields=id,score', data, format='json').data
+        self.assertEqual(sparse, [{'id': t['id'], 'score': t['score']} for t in full])
+
+        unexplained = self.client.post(self.url + '?explain=false&keep=1', data, format='json')
+        self.assertNotIn('explanation', unexplained.data[0])
+        self.assertEqual(unexplained.data[0]['title'], full[0]['title'])
+        # PATCHes of an unexplained analysis stay unexplained
+        delta = self.client.patch(reverse('analysis-delta', args=[unexplained['X-Analysis-Id']]), {"id": 2, "importance": 10}, format='json')
+        self.assertEqual(delta.status_code, status.HTTP_200_OK)
+        self.assertNotIn('explanation', delta.data['changes'][0])
+
+class AnalysisDeltaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        far = str(date.today() + timedelta(days=60))
+        self.tasks = [
+            {"id": 1, "title": "A", "due_date": far, "estimated_hours": 8, "importance": 5, "dependencies": []},
+            {"id": 2, "title": "B", "due_date": far, "estimated_hours": 8, "importance": 4, "dependencies": []},
+            {"id": 3, "title": "C", "due_date": far, "estimated_hours": 8, "importance": 3, "dependencies": [1]},
+        ]
+        response = self.client.post(reverse('analyze-tasks') + '?keep=1', self.tasks, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.analysis_id = response['X-Analysis-Id']
+        self.url = reverse('analysis-delta', args=[self.analysis_id])
+
+    def test_patch_returns_rank_diff(self):
+        # Moving C's dependency from A to B makes B the blocker.
+        response = self.client.patch(self.url, {"id": 3, "dependencies": [2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changes = {c['id']: c for c in response.data['changes']}
+        self.assertEqual(set(changes), {1, 2})
+        self.assertEqual(changes[2]['rank'], 1)
+        self.assertEqual(changes[2]['previous_rank'], 2)
+
+        # The delta result matches a full re-analysis of the edited list.
+        self.tasks[2]['dependencies'] = [2]
+        full = self.client.post(reverse('analyze-tasks'), self.tasks, format='json').data
+        scores = {t['id']: t['score'] for t in full}
+        for task_id, change in changes.items():
+            self.assertEqual(change['score'], scores[task_id])
+
+    def test_patch_rejects_new_cycle(self):
+        response = self.client.patch(self.url, {"id": 1, "dependencies": [3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_patch_unknown_analysis(self):
+        response = self.client.patch(reverse('analysis-delta', args=['missing']), {"id": 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_analysis_only_stored_on_request(self):
+        response = self.client.post(reverse('analyze-tasks'), self.tasks, format='json')
+        self.assertNotIn('X-Analysis-Id', response)
+
+    @patch('tasks.analysis.LOCK_WAIT', 0)
+    def test_concurrent_patch_conflicts(self):
+        with locked_analysis(self.analysis_id):
+            response = self.client.patch(self.url, {"id": 3, "dependencies": [2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        # The lock is released afterwards
+        response = self.client.patch(self.url, {"id": 3, "dependencies": [2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class ReadReplicaTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def test_router_uses_replica_only_inside_context(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Task))
+        with use_read_replica():
+            self.assertEqual(router.db_for_read(Task), 'replica')
+            self.assertEqual(router.db_for_write(Task), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'tasks'))
+
+    def test_suggest_reads_from_replica(self):
+        blocker = Task.objects.create(title="Blocker", due_date=date.today(), estimated_hours=1, importance=5)
+        blocked = Task.objects.create(title="Blocked", due_date=date.today(), estimated_hours=1, importance=5)
+        blocked.dependencies.add(blocker)
+
+        response = self.client.get(reverse('suggest-tasks'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['id'], blocker.id)
+
+    def test_file_replica_has_no_dirty_reads(self):
+        from django.db import connections
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        with tempfile.TemporaryDirectory() as tmp:
+            replica = DatabaseWrapper(dict(connections['replica'].settings_dict, NAME=os.path.join(tmp, 'db.sqlite3')), alias='replica')
+            try:
+                with replica.cursor() as cursor:
+                    self.assertEqual(cursor.execute('PRAGMA query_only').fetchone()[0], 1)
+                    self.assertEqual(cursor.execute('PRAGMA read_uncommitted').fetchone()[0], 0)
+            finally:
+                replica.close()
+
+    def test_health(self):
+        response = self.client.get(reverse('health'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['databases'], {'default': 'ok', 'replica': 'ok'})
+
+@override_settings(TASK_JOB_THRESHOLD_BYTES=200, TASK_JOB_WORKERS=0)
+class AnalysisJobTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('analyze-tasks')
+        self.tasks = [
+            {"id": i, "title": f"Task {i}", "due_date": str(date.today()), "estimated_hours": 3, "importance": i, "dependencies": []}
+            for i in range(1, 6)
+        ]
+
+    def test_large_payload_is_queued_and_processed(self):
+        response = self.client.post(self.url, self.tasks, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        status_url = response['Location']
+
+        self.assertEqual(self.client.get(status_url).data['status'], AnalysisJob.QUEUED)
+
+        self.assertIsNotNone(jobs.process_next())
+        result = self.client.get(status_url).data
+        self.assertEqual(result['status'], AnalysisJob.DONE)
+        self.assertEqual(result['progress'], 1)
+        self.assertEqual([t['id'] for t in result['results']], [5, 4, 3, 2, 1])
+
+    def test_queued_job_honours_fields_and_explain(self):
+        response = self.client.post(self.url + '?fields=id,score', self.tasks, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        with patch('tasks.analysis.get_score_explanation') as explain:
+            jobs.process_next()
+        explain.assert_not_called()
+        results = self.client.get(response['Location']).data['results']
+        self.assertEqual([set(t) for t in results], [{'id', 'score'}] * len(self.tasks))
+
+    def test_small_payload_stays_synchronous(self):
+        response = self.client.post(self.url, self.tasks[:1], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_queue_decision_without_content_length(self):
+        for tasks, queued in [(self.tasks, True), (self.tasks[:1], False)]:
+            request = Request(APIRequestFactory().post(self.url, tasks, format='json'))
+            del request.META['CONTENT_LENGTH']
+            self.assertIs(jobs.should_queue(request), queued)
+
+    def test_failed_job_reports_error(self):
+        self.tasks[0]['dependencies'] = [2]
+        self.tasks[1]['dependencies'] = [1]
+        response = self.client.post(self.url, self.tasks, format='json')
+        jobs.process_next()
+        result = self.client.get(response['Location']).data
+        self.assertEqual(result['status'], AnalysisJob.FAILED)
+        self.assertIn('Circular dependencies', result['error']['error'])
+
+    def test_admission_control(self):
+        with override_settings(TASK_JOB_MAX_QUEUED_BYTES=1000):
+            first = self.client.post(self.url, self.tasks, format='json')
+            self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+            second = self.client.post(self.url, self.tasks * 2, format='json')
+            self.assertEqual(second.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        with override_settings(TASK_JOB_MAX_RUNNING=0):
+            self.assertIsNone(jobs.process_next())
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_large_binary_payload_is_queued(self):
+        for task in self.tasks:
+            task['title'] *= 5
+        body = msgpack.packb(to_columns(self.tasks))
+        self.assertGreater(len(body), 200)
+        response = self.client.post(self.url, body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        jobs.process_next()
+        result = self.client.get(response['Location']).data
+        self.assertEqual(result['status'], AnalysisJob.DONE)
+        self.assertEqual(result['results']['id'], [5, 4, 3, 2, 1])
+
+    def test_payload_size_counts_bytes(self):
+        body = json.dumps([dict(self.tasks[0], title="Tâche ✓")], ensure_ascii=False).encode('utf-8')
+        job = jobs.submit(body)
+        self.assertEqual(job.payload_bytes, len(body))
+        self.assertEqual(bytes(job.payload), body)
+
+        with override_settings(TASK_JOB_MAX_QUEUED_BYTES=2 * len(body) - 1):
+            with self.assertRaises(jobs.QueueFull):
+                jobs.submit(body)
+        self.assertEqual(AnalysisJob.objects.count(), 1)  # The rejected job was rolled back
+
+    def _crash(self, job):
+        # The worker died after claiming the job: its heartbeat stops.
+        AnalysisJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+    @override_settings(TASK_JOB_MAX_RUNNING=1)
+    def test_crashed_worker_job_is_requeued(self):
+        response = self.client.post(self.url, self.tasks, format='json')
+        crashed = jobs.claim_next()
+        self._crash(crashed)
+
+        # The dead worker's job neither blocks the queue nor stays running forever.
+        with self.assertLogs('tasks.jobs', 'WARNING'):
+            job = jobs.process_next()
+        self.assertEqual(job.id, crashed.id)
+        result = self.client.get(response['Location']).data
+        self.assertEqual(result['status'], AnalysisJob.DONE)
+        self.assertEqual(AnalysisJob.objects.get(id=job.id).attempts, 2)
+
+    @override_settings(TASK_JOB_MAX_ATTEMPTS=1)
+    def test_job_fails_after_max_attempts(self):
+        response = self.client.post(self.url, self.tasks, format='json')
+        self._crash(jobs.claim_next())
+        with self.assertLogs('tasks.jobs', 'WARNING'):
+            self.assertEqual(jobs.requeue_stale(), 1)
+        result = self.client.get(response['Location']).data
+        self.assertEqual(result['status'], AnalysisJob.FAILED)
+        self.assertEqual(result['error'], jobs.WORKER_LOST_ERROR)
+
+    def test_only_finished_jobs_expire(self):
+        done = jobs.submit(json.dumps(self.tasks))
+        jobs.process_next()
+        waiting = jobs.submit(json.dumps(self.tasks))
+        self.assertIsNone(AnalysisJob.objects.get(id=waiting.id).expires_at)
+
+        # A job that waited past the TTL stays queued; an expired result goes.
+        long_ago = timezone.now() - timedelta(days=1)
+        AnalysisJob.objects.filter(id=waiting.id).update(created_at=long_ago)
+        AnalysisJob.objects.filter(id=done.id).update(expires_at=long_ago)
+        self.assertEqual(jobs.purge_expired(), 1)
+        self.assertEqual(list(AnalysisJob.objects.values_list('id', flat=True)), [waiting.id])
+        response = self.client.get(reverse('analysis-job', args=[waiting.id]))
+        self.assertEqual(response.data['status'], AnalysisJob.QUEUED)
+
+class BinaryWireFormatTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('analyze-tasks')
+        today = date.today()
+        self.columns = {
+            'id': [1, 2, 3],
+            'title': ['A', 'B', 'C'],
+            'due_date': [str(today + timedelta(days=30)), str(today), str(today + timedelta(days=3))],
+            'estimated_hours': [8, 1.5, 30],
+            'importance': [3, 9, 6],
+            'dependencies': [[], [1], [1]],
+        }
+
+    def json_results(self):
+        rows = [dict(zip(self.columns, values)) for values in zip(*self.columns.values())]
+        response = self.client.post(self.url, rows, format='json')
+        return [(t['id'], t['score'], t['explanation']) for t in response.data]
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_matches_json(self):
+        response = self.client.post(
+            self.url, msgpack.packb(self.columns), content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = msgpack.unpackb(response.content)
+        self.assertEqual(list(zip(result['id'], result['score'], result['explanation'])), self.json_results())
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_validation_errors(self):
+        del self.columns['importance']
+        self.columns['due_date'][1] = 'tomorrow'
+        response = self.client.post(self.url, msgpack.packb(self.columns), content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('importance', response.json())
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_non_finite_hours_rejected(self):
+        for hours in (float('nan'), float('inf'), float('-inf')):
+            self.columns['estimated_hours'][2] = hours
+            response = self.client.post(self.url, msgpack.packb(self.columns), content_type='application/msgpack')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json(), {'estimated_hours': ["Row 2: A valid number is required."]})
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_integral_float_importance(self):
+        expected = self.json_results()
+        self.columns['importance'] = [float(v) for v in self.columns['importance']]
+        response = self.client.post(
+            self.url, msgpack.packb(self.columns), content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = msgpack.unpackb(response.content)
+        self.assertEqual(list(zip(result['id'], result['score'], result['explanation'])), expected)
+        self.assertTrue(all(type(v) is int for v in result['importance']))
+
+        self.columns['importance'][0] = 2.5
+        response = self.client.post(self.url, msgpack.packb(self.columns), content_type='application/msgpack')
+        self.assertEqual(response.json(), {'importance': ["Row 0: A valid integer is required."]})
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_invalid_dependencies(self):
+        for dependencies in ([5] * len(self.columns['title']), [[True]] * len(self.columns['title'])):
+            self.columns['dependencies'] = dependencies
+            response = self.client.post(self.url, msgpack.packb(self.columns), content_type='application/msgpack')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json(), {'dependencies': ["Row 0: Expected a list of integers."]})
+
+    @unittest.skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_cycle_rejected(self):
+        self.columns['dependencies'][0] = [2]
+        response = self.client.post(self.url, msgpack.packb(self.columns), content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @unittest.skipUnless(pa, "pyarrow is not installed")
+    def test_arrow_matches_json(self):
+        columns = dict(self.columns, due_date=[date.fromisoformat(d) for d in self.columns['due_date']])
+        columns['estimated_hours'] = [float(h) for h in columns['estimated_hours']]
+        table = pa.table(columns)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        content_type = 'application/vnd.apache.arrow.stream'
+        response = self.client.post(self.url, sink.getvalue().to_pybytes(), content_type=content_type, HTTP_ACCEPT=content_type)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = pa.ipc.open_stream(response.content).read_all().to_pydict()
+        self.assertEqual(list(zip(result['id'], result['score'], result['explanation'])), self.json_results())
+
+class GraphCacheTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        graph_cache.invalidate()
+        today = date.today()
+        self.a = Task.objects.create(title="A", due_date=today, estimated_hours=1, importance=5)
+        self.b = Task.objects.create(title="B", due_date=today, estimated_hours=1, importance=5)
+        self.c = Task.objects.create(title="C", due_date=today, estimated_hours=1, importance=5)
+        self.b.dependencies.add(self.a)
+        self.c.dependencies.add(self.a, self.b)
+
+    def test_build_csr(self):
+        words = graph_cache.build_csr([3, 1, 2], [(2, 1), (3, 1), (3, 2), (3, 99)])
+        # Header, ids, then forward offsets/edges (by node index); the edge to 99 is dropped.
+        self.assertEqual(list(words[:4]), [graph_cache.MAGIC, 0, 3, 3])
+        self.assertEqual(list(words[4:7]), [1, 2, 3])
+        self.assertEqual(list(words[7:11]), [0, 0, 1, 3])
+        self.assertEqual(list(words[11:14]), [0, 0, 1])
+
+    def test_snapshot_matches_db(self):
+        graph = graph_cache.get_graph()
+        self.assertEqual(sorted(graph.dependencies(self.c.id)), sorted([self.a.id, self.b.id]))
+        self.assertEqual(sorted(graph.dependents(self.a.id)), sorted([self.b.id, self.c.id]))
+        self.assertEqual(graph.dependents_count(self.a.id), 2)
+        self.assertEqual(graph.dependents_count(self.c.id), 0)
+        self.assertEqual(graph.dependencies(12345), [])
+
+    def test_dependency_change_invalidates(self):
+        before = graph_cache.get_graph()
+        self.c.dependencies.remove(self.a)
+        after = graph_cache.get_graph()
+        self.assertGreater(after.version, before.version)
+        self.assertEqual(after.dependents_count(self.a.id), 1)
+
+    @override_settings(TASK_GRAPH_CACHE_CHECK_INTERVAL=0)
+    def test_bulk_changes_detected_by_fingerprint(self):
+        self.assertEqual(graph_cache.get_graph().dependents_count(self.c.id), 0)
+        # bulk_create sends no m2m_changed signal
+        Task.dependencies.through.objects.bulk_create([Task.dependencies.through(from_task=self.a, to_task=self.c)])
+        self.assertEqual(graph_cache.get_graph().dependents_count(self.c.id), 1)
+        Task.dependencies.through.objects.filter(to_task=self.c).delete()
+        self.assertEqual(graph_cache.get_graph().dependents_count(self.c.id), 0)
+
+    def test_suggest_same_with_and_without_cache(self):
+        with_cache = self.client.get(reverse('suggest-tasks')).json()
+        with override_settings(TASK_GRAPH_CACHE=False):
+            without_cache = self.client.get(reverse('suggest-tasks')).json()
+        self.assertEqual(
+            [(t['id'], t['score'], sorted(t['dependencies'])) for t in with_cache],
+            [(t['id'], t['score'], sorted(t['dependencies'])) for t in without_cache],
+        )
+        self.assertEqual(with_cache[0]['id'], self.a.id)
+
+    @override_settings(TASK_GRAPH_CACHE=False)
+    def test_suggest_without_cache_selects_requested_columns(self):
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = self.client.get(reverse('suggest-tasks') + '?fields=id,score')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 2)  # Task columns, then all edges
+        self.assertNotIn('"title"', queries[0]['sql'])
+
+    def test_suggest_fields_and_explain_endpoint(self):
+        for cache_enabled in (True, False):
+            with override_settings(TASK_GRAPH_CACHE=cache_enabled):
+                full = self.client.get(reverse('suggest-tasks')).json()
+                sparse = self.client.get(reverse('suggest-tasks') + '?fields=id,score').json()
+                self.assertEqual(sparse, [{'id': t['id'], 'score': t['score']} for t in full])
+
+                # The on-demand explanation matches the inline one.
+                response = self.client.get(reverse('task-explain', args=[self.a.id]))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data['score'], full[0]['score'])
+                self.assertEqual(response.data['explanation'], full[0]['explanation'])
+
+        response = self.client.get(reverse('task-explain', args=[12345]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,7 +1,11 @@
 from django.urls import path
-from .views import AnalyzeTasksView, SuggestTasksView
+from .views import AnalysisDeltaView, AnalysisJobView, AnalyzeTasksView, HealthView, SuggestTasksView, TaskExplainView
 
 urlpatterns = [
     path('analyze/', AnalyzeTasksView.as_view(), name='analyze-tasks'),
+    path('analyze/<str:analysis_id>/', AnalysisDeltaView.as_view(), name='analysis-delta'),
+    path('jobs/<uuid:job_id>/', AnalysisJobView.as_view(), name='analysis-job'),
+    path('<int:task_id>/explain/', TaskExplainView.as_view(), name='task-explain'),
     path('suggest/', SuggestTasksView.as_view(), name='suggest-tasks'),
+    path('health/', HealthView.as_view(), name='health'),
 ]
@@ -1,82 +1,233 @@
+import json
+from collections import defaultdict
+
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import TaskAnalysisSerializer, TaskSerializer
-from .scoring import calculate_priority_score, detect_cycles, get_score_explanation
-from .models import Task
+from rest_framework.settings import api_settings
+from .serializers import TaskAnalysisSerializer
+from .db import check_databases, use_read_replica
+from .columns import TaskColumns
+from .parsers import binary_parsers
+from .renderers import binary_renderers
+from .analysis import (
+    AnalysisBusy, AnalysisError, analyze_columns, analyze_tasks, apply_changes, fetch_dependencies, load_analysis,
+    locked_analysis, select_fields,
+)
+from .graph_cache import get_graph
+from .scoring import calculate_priority_score, count_dependents, get_score_explanation
+from .models import AnalysisJob, Task
+from . import jobs
+
+# Columns SuggestTasksView needs for scoring, whatever ?fields= asks for.
+SCORING_FIELDS = ('id', 'due_date', 'estimated_hours', 'importance')
+
+
+def query_flag(request, name, default):
+    """Boolean query parameter: 1/true/yes/on or 0/false/no/off."""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ('0', 'false', 'no', 'off', '')
+
+
+def response_options(request):
+    """
+    Read the optional ?fields=id,score,... and ?explain=false query parameters.
+    Returns (fields or None for all, explain). Explanations are only built
+    when explain is not turned off and, with ?fields=, 'explanation' is listed.
+    """
+    fields = request.query_params.get('fields')
+    if fields is not None:
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+    explain = query_flag(request, 'explain', True)
+    if fields is not None and 'explanation' not in fields:
+        explain = False
+    return fields, explain
+
 
 class AnalyzeTasksView(APIView):
+    # MessagePack / Arrow input and output when the optional packages are installed.
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + binary_parsers()
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + binary_renderers()
+
     def post(self, request):
-        # Allow single object or list
+        fields, explain = response_options(request)
+        if jobs.should_queue(request):
+            return self.queue(request, fields, explain)
+        try:
+            data = request.data
+            if isinstance(data, TaskColumns):
+                return Response(select_fields(analyze_columns(data, explain=explain), fields))
+            # ?keep=1 stores the analysis for what-if PATCHes
+            results, analysis_id = analyze_tasks(data, explain=explain, keep=query_flag(request, 'keep', False))
+        except AnalysisError as exc:
+            return Response(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+        headers = {'X-Analysis-Id': analysis_id} if analysis_id else None
+        return Response(select_fields(results, fields), headers=headers)
+
+    def queue(self, request, fields, explain):
+        """Accept an oversized payload as a background job (202) or shed it (503)."""
+        options = {'keep': query_flag(request, 'keep', False), 'fields': fields, 'explain': explain}
+        try:
+            job = jobs.submit(request.body, jobs.media_type(request), options=options)
+        except jobs.QueueFull:
+            return Response(
+                {"error": "Too many large analyses are queued. Please retry later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '30'},
+            )
+        status_url = reverse('analysis-job', args=[job.id])
+        return Response(
+            {'job_id': job.id, 'status': job.status, 'status_url': status_url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': status_url},
+        )
+
+class AnalysisDeltaView(APIView):
+    """
+    PATCH /api/tasks/analyze/<analysis_id>/ with one or more changed tasks, for
+    analyses created with ?keep=1. Each change needs an 'id'; fields left out
+    keep their analyzed values, and unknown ids are added as new tasks.
+    Returns only the tasks whose score or rank changed, or 409 while another
+    PATCH of the same analysis is running.
+    """
+    def patch(self, request, analysis_id):
+        try:
+            with locked_analysis(analysis_id):
+                return self.apply(request, analysis_id)
+        except AnalysisBusy as exc:
+            return Response(exc.detail, status=status.HTTP_409_CONFLICT)
+
+    def apply(self, request, analysis_id):
+        state = load_analysis(analysis_id)
+        if state is None:
+            return Response({"error": "Analysis not found or expired."}, status=status.HTTP_404_NOT_FOUND)
+
         data = request.data
         if not isinstance(data, list):
             data = [data]
-            
-        serializer = TaskAnalysisSerializer(data=data, many=True)
-        if serializer.is_valid():
-            tasks = serializer.validated_data
-            
-            # Check cycles
-            def fetch_dependencies(task_ids):
-                fetched = Task.objects.filter(id__in=task_ids).values('id', 'dependencies')
-                # Convert QuerySet to list of dicts, handling many-to-many serialization if needed
-                # values() returns a dict, but 'dependencies' M2M might need handling if not pre-fetched?
-                # Actually values('dependencies') returns one row per dependency for M2M, which is tricky.
-                # Better to use prefetch_related or just iterate.
-                # Let's use a simpler approach for clarity and correctness with M2M.
-                
-                tasks_with_deps = Task.objects.filter(id__in=task_ids).prefetch_related('dependencies')
-                results = []
-                for t in tasks_with_deps:
-                    results.append({
-                        'id': t.id,
-                        'dependencies': list(t.dependencies.values_list('id', flat=True))
-                    })
-                return results
-
-            if detect_cycles(tasks, dependency_fetcher=fetch_dependencies):
-                return Response(
-                    {"error": "Circular dependencies detected. Please resolve dependencies before analyzing."}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Map for O(1) lookup
-            tasks_map = {t.get('id'): t for t in tasks if t.get('id') is not None}
-            
-            # Calculate scores
-            results = []
-            for task in tasks:
-                score = calculate_priority_score(task, tasks_map)
-                explanation = get_score_explanation(task, score, tasks_map)
-                
-                # Convert OrderedDict to dict for response
-                task_data = dict(task)
-                task_data['score'] = score
-                task_data['explanation'] = explanation
-                results.append(task_data)
-            
-            # Sort by score desc
-            results.sort(key=lambda x: x['score'], reverse=True)
-            
-            return Response(results)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if any(not isinstance(change, dict) or change.get('id') is None for change in data):
+            return Response({"error": "Every change must include the task 'id'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        merged = []
+        for change in data:
+            pos = state['index'].get(change['id'])
+            base = {}
+            if pos is not None:
+                base = {k: v for k, v in state['rows'][pos].items() if k not in ('score', 'explanation')}
+            merged.append({**base, **change})
+
+        serializer = TaskAnalysisSerializer(data=merged, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            changes = apply_changes(analysis_id, state, serializer.validated_data, dependency_fetcher=fetch_dependencies)
+        except AnalysisError as exc:
+            return Response(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'analysis_id': analysis_id, 'changes': changes})
 
 class SuggestTasksView(APIView):
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + binary_renderers()
+
     def get(self, request):
-        db_tasks = Task.objects.all()
-        if not db_tasks.exists():
+        fields, explain = response_options(request)
+        graph = get_graph()
+        # Only task columns that are scored or asked for are queried.
+        columns = [name for name in ('id', 'title', 'due_date', 'estimated_hours', 'importance')
+                   if name in SCORING_FIELDS or fields is None or name in fields]
+        with use_read_replica():
+            tasks_data = list(Task.objects.values(*columns))
+            if graph is None:
+                # One query for all edges; dependents counts need every edge anyway.
+                dependencies = defaultdict(list)
+                for task_id, dependency_id in Task.dependencies.through.objects.values_list('from_task_id', 'to_task_id'):
+                    dependencies[task_id].append(dependency_id)
+        if not tasks_data:
             return Response([])
-            
-        tasks_data = TaskSerializer(db_tasks, many=True).data
-        tasks_map = {t['id']: t for t in tasks_data}
-        
+
+        if graph is None:
+            dependents = count_dependents({'dependencies': deps} for deps in dependencies.values())
+            dependents_count = lambda task_id: dependents.get(task_id, 0)
+            task_dependencies = lambda task_id: dependencies.get(task_id, [])
+        else:
+            # Edges come from the shared graph snapshot
+            dependents_count = graph.dependents_count
+            task_dependencies = graph.dependencies
+        if fields is None or 'dependencies' in fields:
+            for task in tasks_data:
+                task['dependencies'] = task_dependencies(task['id'])
+
         scored_tasks = []
         for task in tasks_data:
-            score = calculate_priority_score(task, tasks_map)
-            explanation = get_score_explanation(task, score, tasks_map)
-            task['score'] = score
-            task['explanation'] = explanation
+            count = dependents_count(task['id'])
+            task['score'] = calculate_priority_score(task, {}, dependents_count=count)
             scored_tasks.append(task)
             
         scored_tasks.sort(key=lambda x: x['score'], reverse=True)
-        return Response(scored_tasks[:3])
+        top = scored_tasks[:3]
+        # Only the suggested tasks are explained
+        if explain:
+            for task in top:
+                task['explanation'] = get_score_explanation(task, task['score'], {}, dependents_count=dependents_count(task['id']))
+        return Response(select_fields(top, fields))
+
+class TaskExplainView(APIView):
+    """Score and explanation for one stored task, for clients that skipped them with ?explain=false."""
+    def get(self, request, task_id):
+        graph = get_graph()
+        with use_read_replica():
+            task = Task.objects.filter(id=task_id).values('id', 'title', 'due_date', 'estimated_hours', 'importance').first()
+            if task is None:
+                return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+            if graph is not None:
+                count = graph.dependents_count(task_id)
+            else:
+                # Uses the index on the dependency table's to_task_id column.
+                count = Task.dependencies.through.objects.filter(to_task_id=task_id).count()
+
+        score = calculate_priority_score(task, {}, dependents_count=count)
+        return Response({
+            'id': task['id'],
+            'title': task['title'],
+            'score': score,
+            'explanation': get_score_explanation(task, score, {}, dependents_count=count),
+        })
+
+class AnalysisJobView(APIView):
+    """Progress and, once finished, the result of a queued analyze request."""
+    def get(self, request, job_id):
+        unexpired = Q(expires_at__isnull=True) | Q(expires_at__gte=timezone.now())
+        job = AnalysisJob.objects.filter(unexpired, id=job_id).first()
+        if job is None:
+            return Response({"error": "Job not found or expired."}, status=status.HTTP_404_NOT_FOUND)
+
+        body = {
+            'job_id': job.id,
+            'status': job.status,
+            'progress': job.progress,
+            'created_at': job.created_at,
+            'finished_at': job.finished_at,
+            'expires_at': job.expires_at,
+        }
+        if job.status == AnalysisJob.DONE:
+            body['analysis_id'] = job.analysis_id or None
+            body['results'] = json.loads(job.result)
+        elif job.status == AnalysisJob.FAILED:
+            body['error'] = json.loads(job.result)
+        return Response(body)
+
+class HealthView(APIView):
+    """Liveness/readiness probe: 200 if every database alias answers, else 503."""
+    def get(self, request):
+        results = check_databases()
+        healthy = all(error is None for error in results.values())
+        body = {
+            'status': 'ok' if healthy else 'error',
+            'databases': {alias: error or 'ok' for alias, error in results.items()},
+        }
+        return Response(body, status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE)